@@ -0,0 +1,128 @@
+# Нагрузочный тест захвата мест: N потоков (у каждого свое соединение)
+# одновременно бронируют одни и те же популярные места.
+#
+#   python benchmarks/bench_claims.py --threads 16 --spots 200
+#   python benchmarks/bench_claims.py --naive   # старый путь "проверил-занял"
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database, CLAIM_OK
+
+
+def naive_claim(database, user_id, spot_id, hours):
+    # Путь "проверил-занял" без транзакции: проверка пересечения с
+    # активными бронями и вставка - отдельные запросы, между ними окно
+    # может занять другой поток. Своими запросами, а не через get_spot:
+    # записи Database содержат только столбцы для экранов
+    connection = database.connection
+    starts_at = int(time.time())
+    ends_at = starts_at + hours * 3600
+    spot = connection.execute(
+        "SELECT price_per_hour FROM spots WHERE id = ? AND is_available = 1", (spot_id,)
+    ).fetchone()
+    if spot is None:
+        return False
+    overlap = connection.execute('''
+        SELECT 1 FROM bookings
+        WHERE spot_id = ? AND status = 'active' AND starts_at < ? AND ends_at > ?
+        LIMIT 1
+    ''', (spot_id, ends_at, starts_at)).fetchone()
+    if overlap:
+        return False
+    time.sleep(0)  # отдаем GIL, как это делал бы await между запросами
+    connection.execute('''
+        INSERT INTO bookings (user_id, spot_id, hours, total_price, starts_at, ends_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', (user_id, spot_id, hours, spot['price_per_hour'] * hours, starts_at, ends_at))
+    return True
+
+
+def worker(path, user_id, spot_ids, naive, counters, lock, barrier):
+    database = Database(path)
+    claimed = taken = errors = 0
+    order = list(spot_ids)
+    random.shuffle(order)
+    barrier.wait()
+    for spot_id in order:
+        try:
+            if naive:
+                ok = naive_claim(database, user_id, spot_id, 1)
+            else:
+                ok = database.claim_spot(user_id, spot_id, 1).status == CLAIM_OK
+        except Exception as e:
+            # Упавшая попытка - не отказ: без счетчика итог "0 двойных"
+            # выглядел бы как успех
+            if not errors:
+                print(f"Ошибка в потоке клиента {user_id}: {e!r}", file=sys.stderr)
+            errors += 1
+            continue
+        if ok:
+            claimed += 1
+        else:
+            taken += 1
+    with lock:
+        counters["claimed"] += claimed
+        counters["taken"] += taken
+        counters["errors"] += errors
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--spots", type=int, default=200)
+    parser.add_argument("--naive", action="store_true")
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        database = Database(path)
+        owner_id = database.register_user(1, "Owner")
+        spot_ids = [
+            database.add_spot(owner_id, f"P{i}", "Популярный адрес", 100)
+            for i in range(args.spots)
+        ]
+        user_ids = [database.register_user(100 + i, f"Client {i}") for i in range(args.threads)]
+        
+        counters = {"claimed": 0, "taken": 0, "errors": 0}
+        lock = threading.Lock()
+        barrier = threading.Barrier(args.threads + 1)
+        threads = [
+            threading.Thread(target=worker, args=(path, user_id, spot_ids, args.naive, counters, lock, barrier))
+            for user_id in user_ids
+        ]
+        for thread in threads:
+            thread.start()
+        barrier.wait()
+        started = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        
+        # Места, где две активные брони пересекаются по времени
+        double_booked = database.connection.execute('''
+            SELECT COUNT(DISTINCT a.spot_id) FROM bookings a
+            JOIN bookings b ON b.spot_id = a.spot_id AND b.id > a.id
+            WHERE a.status = 'active' AND b.status = 'active'
+              AND a.starts_at < b.ends_at AND b.starts_at < a.ends_at
+        ''').fetchone()[0]
+    
+    attempts = counters["claimed"] + counters["taken"]
+    print(f"Режим: {'naive' if args.naive else 'claim_spot'}, потоков: {args.threads}, мест: {args.spots}")
+    print(f"Попыток: {attempts} за {elapsed:.2f} с ({attempts / elapsed:.0f}/с)")
+    print(f"Успешных захватов: {counters['claimed']} ({counters['claimed'] / elapsed:.0f}/с)")
+    print(f"Отказов 'уже занято': {counters['taken']}")
+    print(f"Двойных бронирований: {double_booked}")
+    if counters["errors"]:
+        print(f"Ошибок: {counters['errors']}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
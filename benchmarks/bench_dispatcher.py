@@ -0,0 +1,302 @@
+# Офлайн-нагрузка на Dispatcher: синтетические апдейты идут прямо в
+# dp.feed_update, сессия бота вместо Telegram только записывает вызовы API.
+# Считает пропускную способность и p50/p95/p99 по каждому хендлеру.
+#
+#   python benchmarks/bench_dispatcher.py --updates 5000 --concurrency 100
+#   python benchmarks/bench_dispatcher.py --users 2000 --spots 20000 --bookings 5000
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from itertools import count
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("BOT_TOKEN", "123456:TEST-TOKEN")
+
+from aiogram import BaseMiddleware
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import EditMessageText, SendMessage
+from aiogram.types import Update
+
+FIRST_USER = 1_000_000
+
+
+# ========== ЗАГЛУШКА СЕССИИ ==========
+class RecordingSession(BaseSession):
+    # Ничего не отправляет: запоминает метод и возвращает правдоподобный ответ
+    def __init__(self):
+        super().__init__()
+        self.calls = Counter()
+        self._message_ids = count(1)
+
+    async def make_request(self, bot, method, timeout=None):
+        self.calls[type(method).__name__] += 1
+        if isinstance(method, (SendMessage, EditMessageText)):
+            result = {
+                "message_id": next(self._message_ids),
+                "date": int(time.time()),
+                "chat": {"id": method.chat_id or 1, "type": "private"},
+                "text": method.text,
+            }
+        else:
+            result = True
+        response = self.check_response(
+            bot=bot, method=method, status_code=200,
+            content=json.dumps({"ok": True, "result": result}),
+        )
+        return response.result
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        yield b""
+
+    async def close(self):
+        pass
+
+
+class HandlerProbe(BaseMiddleware):
+    # Внутренний middleware роутера: вызывается только для сработавшего
+    # хендлера и сообщает его имя в probe, переданный в feed_update
+    async def __call__(self, handler, event, data):
+        probe = data.get("probe")
+        if probe is not None:
+            probe["handler"] = data["handler"].callback.__name__
+        return await handler(event, data)
+
+
+# ========== АПДЕЙТЫ ==========
+class Updates:
+    def __init__(self):
+        self._ids = count(1)
+
+    def _user(self, user_id):
+        return {"id": user_id, "is_bot": False, "first_name": f"User{user_id}", "username": f"user{user_id}"}
+
+    def message(self, user_id, text):
+        update_id = next(self._ids)
+        return {
+            "update_id": update_id,
+            "message": {
+                "message_id": update_id,
+                "date": int(time.time()),
+                "chat": {"id": user_id, "type": "private"},
+                "from": self._user(user_id),
+                "text": text,
+            },
+        }
+
+    def location(self, user_id, latitude, longitude):
+        update_id = next(self._ids)
+        return {
+            "update_id": update_id,
+            "message": {
+                "message_id": update_id,
+                "date": int(time.time()),
+                "chat": {"id": user_id, "type": "private"},
+                "from": self._user(user_id),
+                "location": {"latitude": latitude, "longitude": longitude},
+            },
+        }
+
+    def callback(self, user_id, data):
+        update_id = next(self._ids)
+        return {
+            "update_id": update_id,
+            "callback_query": {
+                "id": str(update_id),
+                "from": self._user(user_id),
+                "chat_instance": str(user_id),
+                "data": data,
+                "message": {
+                    "message_id": update_id,
+                    "date": int(time.time()),
+                    "chat": {"id": user_id, "type": "private"},
+                    "text": "...",
+                },
+            },
+        }
+
+
+def random_point():
+    # Точка в пределах города ~40x40 км: координаты мест и геопозиции "Рядом"
+    return random.uniform(55.55, 55.91), random.uniform(37.35, 37.95)
+
+
+def make_scenarios(args, updates, users, admins, spot_ids, cursor):
+    # Сценарий - цепочка апдейтов одного пользователя, которые идут по
+    # порядку (как в настоящем чате); сценарии разных пользователей идут
+    # параллельно
+    def start(user_id):
+        return [updates.message(user_id, "/start")]
+
+    def browse(user_id):
+        spot_id = random.choice(spot_ids)
+        return [
+            updates.message(user_id, "🚗 Найти место"),
+            updates.callback(user_id, f"spots_next_{cursor[0]}_{cursor[1]}"),
+            updates.callback(user_id, f"view_spot_{spot_id}"),
+        ]
+
+    def book(user_id):
+        spot_id = random.choice(spot_ids)
+        return [
+            updates.callback(user_id, f"view_spot_{spot_id}"),
+            updates.callback(user_id, f"book_{spot_id}_{random.choice([1, 2, 3, 24])}"),
+        ]
+
+    def search(user_id):
+        return [updates.message(user_id, f"/find адрес {random.randint(1, 99)} до 500")]
+
+    def mine(user_id):
+        return [
+            updates.message(user_id, "🏠 Мои места"),
+            updates.message(user_id, "📋 Мои брони"),
+        ]
+
+    def add_spot(user_id):
+        return [
+            updates.message(user_id, "➕ Выложить место"),
+            updates.message(user_id, f"N{random.randint(1, 10_000)}"),
+            updates.message(user_id, f"Новый адрес {random.randint(1, 1000)}"),
+            updates.message(user_id, str(random.randint(50, 500))),
+            random.choice([updates.message(user_id, "Пропустить"), updates.location(user_id, *random_point())]),
+        ]
+
+    def nearby(user_id):
+        return [updates.location(user_id, *random_point())]
+
+    def admin(_):
+        user_id = random.choice(admins)
+        return [
+            updates.message(user_id, "👑 Админ"),
+            updates.callback(user_id, random.choice(["admin_users", "admin_spots", "admin_bookings", "admin_stats"])),
+        ]
+
+    kinds = [start, browse, book, search, mine, add_spot, nearby, admin]
+    weights = [3, 6, 3, 2, 3, 1, 2, 1]
+    scenarios = []
+    total = 0
+    while total < args.updates:
+        kind = random.choices(kinds, weights)[0]
+        scenario = kind(random.choice(users))
+        scenarios.append(scenario)
+        total += len(scenario)
+    return scenarios
+
+
+# ========== ПОДГОТОВКА ==========
+def seed(database, args):
+    users = [FIRST_USER + i for i in range(args.users)]
+    owner_ids = [database.register_user(telegram_id, f"User {telegram_id}", f"user{telegram_id}") for telegram_id in users]
+    admins = users[:max(args.users // 100, 1)]
+    for telegram_id in admins:
+        database.set_admin(telegram_id)
+
+    spot_ids = [
+        database.add_spot(random.choice(owner_ids), f"A{i}", f"Адрес {i}", random.randint(50, 1000), *random_point())
+        for i in range(args.spots)
+    ]
+    for spot_id in random.sample(spot_ids, min(args.bookings, len(spot_ids))):
+        database.claim_spot(random.choice(owner_ids), spot_id, random.randint(1, 24))
+
+    rows, _ = database.get_spots_page()
+    cursor = (rows[-1]["created_at"], rows[-1]["id"]) if rows else ("", 0)
+    return users, admins, spot_ids, cursor
+
+
+def percentile(values, q):
+    return values[min(int(q * len(values)), len(values) - 1)]
+
+
+async def run(args, bot_module, users, admins, spot_ids, cursor):
+    session = RecordingSession()
+    app = bot_module.create_app(session=session)
+    bot, dp = app.bot, app.dp
+    if not args.throttle:
+        # Синтетические пользователи кликают быстрее живых - без --throttle
+        # меряем сами хендлеры, а не отказы лимитера
+        bot_module.throttling.limits = {name: (1e9, 1e9) for name in bot_module.throttling.limits}
+    probe_middleware = HandlerProbe()
+    bot_module.router.message.middleware(probe_middleware)
+    bot_module.router.callback_query.middleware(probe_middleware)
+
+    updates = Updates()
+    scenarios = make_scenarios(args, updates, users, admins, spot_ids, cursor)
+    # Все сценарии пользователя достаются одному клиенту, иначе два его
+    # диалога добавления места перемешались бы в одном FSM
+    queues = [[] for _ in range(args.concurrency)]
+    for scenario in scenarios:
+        user_id = (scenario[0].get("message") or scenario[0]["callback_query"])["from"]["id"]
+        queues[user_id % args.concurrency].append(scenario)
+
+    latencies = defaultdict(list)
+    errors = Counter()
+
+    async def client(queue):
+        for scenario in queue:
+            for raw in scenario:
+                update = Update.model_validate(raw, context={"bot": bot})
+                probe = {}
+                started = time.perf_counter()
+                try:
+                    await dp.feed_update(bot, update, probe=probe)
+                except Exception:
+                    errors[probe.get("handler", "unhandled")] += 1
+                latencies[probe.get("handler", "unhandled")].append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client(queue) for queue in queues))
+    elapsed = time.perf_counter() - started
+
+    await dp.storage.close()
+    return session, latencies, errors, elapsed
+
+
+def report(session, latencies, errors, elapsed):
+    total = sum(len(values) for values in latencies.values())
+    print(f"{'хендлер':<22}{'апдейтов':>9}{'в сек':>9}{'p50 мс':>9}{'p95 мс':>9}{'p99 мс':>9}{'ошибок':>8}")
+    for name, values in sorted(latencies.items(), key=lambda item: -len(item[1])):
+        values.sort()
+        print(
+            f"{name:<22}{len(values):>9}{len(values) / elapsed:>9.0f}"
+            f"{percentile(values, 0.50) * 1000:>9.2f}"
+            f"{percentile(values, 0.95) * 1000:>9.2f}"
+            f"{percentile(values, 0.99) * 1000:>9.2f}"
+            f"{errors[name]:>8}"
+        )
+    print(f"\nВсего: {total} апдейтов за {elapsed:.2f} с, {total / elapsed:.0f} апдейтов/с")
+    print("Вызовы API: " + ", ".join(f"{name} {calls}" for name, calls in session.calls.most_common()))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--updates", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--spots", type=int, default=2000)
+    parser.add_argument("--bookings", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--throttle", action="store_true", help="не отключать лимиты запросов")
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Путь глобальной базы Config читает из DB_PATH при импорте -
+        # задаем временный файл до импорта bot.py
+        os.environ["DB_PATH"] = os.path.join(tmp, "bench.db")
+        import bot as bot_module
+
+        users, admins, spot_ids, cursor = seed(bot_module.db, args)
+        session, latencies, errors, elapsed = asyncio.run(run(args, bot_module, users, admins, spot_ids, cursor))
+        bot_module.adb.close()
+        bot_module.db.connection.close()
+
+    report(session, latencies, errors, elapsed)
+
+
+if __name__ == "__main__":
+    main()
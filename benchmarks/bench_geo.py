@@ -0,0 +1,129 @@
+# "📍 Рядом": ближайшие свободные места к точке через сетку в памяти
+# против расстояния до каждого места прямо в запросе (haversine на
+# каждую строку). Плюс время загрузки сетки при старте.
+#
+#   python benchmarks/bench_geo.py --spots 100000 --busy 20000
+#   python benchmarks/bench_geo.py --size 200 --radius 5000
+import argparse
+import math
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import geo
+from database import Database
+
+# Центр города; места и точки запросов - в квадрате --size км вокруг
+CENTER = (55.75, 37.62)
+HOUR = 3600
+
+SQL_NEARBY = '''
+    SELECT s.id, s.spot_number, s.address, s.price_per_hour, u.full_name as owner_name,
+           distance(?, ?, s.latitude, s.longitude) as meters
+    FROM spots s
+    JOIN users u ON s.owner_id = u.id
+    WHERE s.is_available = 1 AND s.latitude IS NOT NULL
+      AND meters <= ? AND NOT EXISTS (
+        SELECT 1 FROM bookings b
+        WHERE b.spot_id = s.id AND b.status = 'active'
+          AND b.starts_at <= ? AND b.ends_at > ?
+    )
+    ORDER BY meters
+    LIMIT ?
+'''
+
+
+def random_point(size):
+    # Градусов на километр: по широте постоянно, по долготе зависит от широты
+    lat = CENTER[0] + random.uniform(-size / 2, size / 2) / 111.2
+    lon = CENTER[1] + random.uniform(-size / 2, size / 2) / (111.2 * math.cos(math.radians(CENTER[0])))
+    return lat, lon
+
+
+def seed(path, args):
+    database = Database(path)
+    owner_ids = [database.register_user(10_000_000 + i, f"User {i}") for i in range(args.users)]
+    with database.transaction() as connection:
+        spots = []
+        for i in range(args.spots):
+            lat, lon = random_point(args.size)
+            spots.append((random.choice(owner_ids), f"A{i}", f"Адрес {i}", random.randint(50, 1000),
+                          lat, lon, geo.cell_id(lat, lon)))
+        connection.executemany('''
+            INSERT INTO spots (owner_id, spot_number, address, price_per_hour, latitude, longitude, geo_cell)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', spots)
+        # Занятые прямо сейчас места: их поиск должен пропускать
+        now = int(time.time())
+        busy = random.sample(range(1, args.spots + 1), min(args.busy, args.spots))
+        connection.executemany('''
+            INSERT INTO bookings (user_id, spot_id, hours, total_price, starts_at, ends_at)
+            VALUES (?, ?, 2, 200, ?, ?)
+        ''', ((random.choice(owner_ids), spot_id, now - HOUR, now + HOUR) for spot_id in busy))
+    database.bump_version("spots", "bookings")
+    database.connection.execute("ANALYZE")
+    return database
+
+
+def measure(func, points):
+    timings = []
+    for lat, lon in points:
+        started = time.perf_counter()
+        func(lat, lon)
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    return statistics.median(timings) * 1000, timings[int(0.99 * (len(timings) - 1))] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--spots", type=int, default=100_000)
+    parser.add_argument("--busy", type=int, default=20_000, help="мест занято прямо сейчас")
+    parser.add_argument("--size", type=float, default=40, help="сторона квадрата с местами, км")
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--sql-queries", type=int, default=20, help="полный проход медленный")
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--radius", type=int, default=20_000, help="метры")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database = seed(os.path.join(tmp, "bench.db"), args)
+        database.sync_intervals()
+
+        started = time.perf_counter()
+        loaded = database.sync_grid()
+        print(f"Загрузка сетки: {loaded} мест за {(time.perf_counter() - started) * 1000:.1f} мс")
+
+        points = [random_point(args.size) for _ in range(args.queries)]
+        connection = database.connection
+        connection.create_function("distance", 4, geo.distance, deterministic=True)
+
+        def sql_nearby(lat, lon):
+            now = int(time.time())
+            return connection.execute(SQL_NEARBY, (lat, lon, args.radius, now, now, args.limit)).fetchall()
+
+        # Обе реализации должны находить одни и те же места
+        for lat, lon in points[:args.sql_queries]:
+            expected = [row[0] for row in sql_nearby(lat, lon)]
+            assert [spot.id for spot in database.get_nearby_spots(lat, lon, args.limit, args.radius)] == expected
+
+        cases = [
+            ("get_nearby_spots", lambda lat, lon: database.get_nearby_spots(lat, lon, args.limit, args.radius),
+             points),
+            ("SQL: haversine по всем", sql_nearby, points[:args.sql_queries]),
+        ]
+        print(f"{'':>24}{'p50, мс':>10}{'p99, мс':>10}")
+        for label, func, sample in cases:
+            p50, p99 = measure(func, sample)
+            print(f"{label:>24}{p50:>10.3f}{p99:>10.3f}")
+        database.close()
+
+
+if __name__ == "__main__":
+    main()
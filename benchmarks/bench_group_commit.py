@@ -0,0 +1,59 @@
+# Пропускная способность записей через AsyncDatabase: group commit
+# против коммита на каждую операцию (max_batch=1), как при потоке /start.
+#
+#   python benchmarks/bench_group_commit.py --writes 5000 --concurrency 200
+#   python benchmarks/bench_group_commit.py --synchronous FULL
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import AsyncDatabase, Database
+
+
+async def run(path, args, max_batch):
+    database = Database(path)
+    database.connection.execute(f"PRAGMA synchronous={args.synchronous}")
+    adb = AsyncDatabase(database, batch_window=args.window / 1000, max_batch=max_batch)
+    
+    queue = asyncio.Queue()
+    for i in range(args.writes):
+        queue.put_nowait(i)
+    
+    async def client():
+        while not queue.empty():
+            i = queue.get_nowait()
+            await adb.register_user(10_000_000 + i, f"User {i}", f"user{i}")
+    
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+    
+    adb.close()
+    users = database.connection.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+    database.connection.close()
+    return elapsed, users
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--writes", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--window", type=float, default=2.0, help="окно сбора пакета, мс")
+    parser.add_argument("--max-batch", type=int, default=64)
+    parser.add_argument("--synchronous", default="NORMAL", choices=["OFF", "NORMAL", "FULL"])
+    args = parser.parse_args()
+    
+    for label, max_batch in [("коммит на запись", 1), ("group commit", args.max_batch)]:
+        with tempfile.TemporaryDirectory() as tmp:
+            elapsed, users = asyncio.run(run(os.path.join(tmp, "bench.db"), args, max_batch))
+        print(f"{label:>18}: {args.writes / elapsed:8.0f} записей/с "
+              f"({elapsed:.2f} с, пользователей в базе: {users})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+# Поиск мест, свободных в окне ("завтра 9-18"): индекс интервалов в памяти
+# против того же запроса целиком в SQLite (NOT EXISTS по пересекающимся
+# броням). Плюс время загрузки индекса при старте.
+#
+#   python benchmarks/bench_intervals.py --spots 20000 --bookings 50000
+#   python benchmarks/bench_intervals.py --days 7 --queries 2000
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database
+
+HOUR = 3600
+DAY = 24 * HOUR
+
+SQL_FREE_SPOTS = '''
+    SELECT s.*, u.full_name as owner_name
+    FROM spots s
+    JOIN users u ON s.owner_id = u.id
+    WHERE s.is_available = 1 AND NOT EXISTS (
+        SELECT 1 FROM bookings b
+        WHERE b.spot_id = s.id AND b.status = 'active'
+          AND b.starts_at < ? AND b.ends_at > ?
+    )
+    ORDER BY s.created_at DESC, s.id DESC
+    LIMIT ?
+'''
+
+
+def seed(path, args, origin):
+    database = Database(path)
+    owner_ids = [database.register_user(10_000_000 + i, f"User {i}") for i in range(args.users)]
+    with database.transaction() as connection:
+        connection.executemany('''
+            INSERT INTO spots (owner_id, spot_number, address, price_per_hour)
+            VALUES (?, ?, ?, ?)
+        ''', ((random.choice(owner_ids), f"A{i}", f"Адрес {i}", random.randint(50, 1000))
+              for i in range(args.spots)))
+        spot_ids = [row[0] for row in connection.execute("SELECT id FROM spots")]
+        # Не больше одной брони на место в сутки - брони места не пересекаются
+        used = set()
+        bookings = []
+        while len(bookings) < args.bookings:
+            spot_id, day = random.choice(spot_ids), random.randrange(args.days)
+            if (spot_id, day) in used:
+                continue
+            used.add((spot_id, day))
+            start = origin + day * DAY + random.randrange(16) * HOUR
+            hours = random.randint(1, 8)
+            bookings.append((random.choice(owner_ids), spot_id, hours, hours * 100, start, start + hours * HOUR))
+        connection.executemany('''
+            INSERT INTO bookings (user_id, spot_id, hours, total_price, starts_at, ends_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', bookings)
+    database.connection.execute("ANALYZE")
+    return database, spot_ids
+
+
+def measure(func, windows):
+    timings = []
+    for start, end in windows:
+        started = time.perf_counter()
+        func(start, end)
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    return statistics.median(timings) * 1000, timings[int(0.99 * (len(timings) - 1))] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--spots", type=int, default=20000)
+    parser.add_argument("--bookings", type=int, default=50000)
+    parser.add_argument("--days", type=int, default=30, help="на сколько дней вперед брони")
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+    
+    origin = (int(time.time()) // DAY + 1) * DAY
+    with tempfile.TemporaryDirectory() as tmp:
+        database, spot_ids = seed(os.path.join(tmp, "bench.db"), args, origin)
+        
+        started = time.perf_counter()
+        loaded = database.sync_intervals()
+        print(f"Загрузка индекса: {loaded} броней за {(time.perf_counter() - started) * 1000:.1f} мс")
+        
+        windows = []
+        for _ in range(args.queries):
+            start = origin + random.randrange(args.days) * DAY + random.randrange(8, 12) * HOUR
+            windows.append((start, start + random.randint(2, 9) * HOUR))
+        index = database.intervals
+        connection = database.connection
+        cases = [
+            ("индекс: место свободно?", lambda start, end: index.is_free(random.choice(spot_ids), start, end)),
+            ("get_free_spots", lambda start, end: database.get_free_spots(start, end, args.limit)),
+            ("только SQL (NOT EXISTS)", lambda start, end: connection.execute(
+                SQL_FREE_SPOTS, (end, start, args.limit)).fetchall()),
+        ]
+        print(f"{'':>26}{'p50, мс':>10}{'p99, мс':>10}")
+        for label, func in cases:
+            p50, p99 = measure(func, windows)
+            print(f"{label:>26}{p50:>10.3f}{p99:>10.3f}")
+        database.close()
+
+
+if __name__ == "__main__":
+    main()
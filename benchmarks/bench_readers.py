@@ -0,0 +1,108 @@
+# Задержка бронирований, пока параллельно крутятся отчеты админки
+# (get_all_spots_admin и get_all_bookings без лимита): отчеты в очереди
+# воркера (--readers 0) против пула соединений только для чтения.
+#
+#   python benchmarks/bench_readers.py --bookings 200000 --claims 500
+#   python benchmarks/bench_readers.py --reports 4 --readers 4
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import AsyncDatabase, Database
+
+FIRST_USER = 10_000_000
+
+
+def seed(path, args):
+    database = Database(path)
+    owner_ids = [database.register_user(FIRST_USER + i, f"User {i}") for i in range(args.users)]
+    with database.transaction() as connection:
+        connection.executemany('''
+            INSERT INTO spots (owner_id, spot_number, address, price_per_hour)
+            VALUES (?, ?, ?, ?)
+        ''', ((random.choice(owner_ids), f"A{i}", f"Адрес {i}", random.randint(50, 1000))
+              for i in range(args.spots + args.claims)))
+        spot_ids = [row[0] for row in connection.execute("SELECT id FROM spots ORDER BY id")]
+        # История: завершенные брони по первым args.spots местам
+        connection.executemany('''
+            INSERT INTO bookings (user_id, spot_id, hours, total_price, status, starts_at, ends_at)
+            VALUES (?, ?, ?, ?, 'completed', 0, 0)
+        ''', ((random.choice(owner_ids), random.choice(spot_ids[:args.spots]), 1, 100)
+              for _ in range(args.bookings)))
+    database.close()
+    return owner_ids, spot_ids[args.spots:]
+
+
+def percentile(values, q):
+    return values[min(int(q * len(values)), len(values) - 1)]
+
+
+async def run(path, args, owner_ids, free_spots, readers, reports):
+    adb = AsyncDatabase(Database(path), readers=readers)
+    spots = list(free_spots)
+    random.shuffle(spots)
+    latencies = []
+    done = False
+    reports_done = 0
+    
+    async def client():
+        while spots:
+            spot_id = spots.pop()
+            started = time.perf_counter()
+            await adb.create_booking(random.choice(owner_ids), spot_id, 1)
+            latencies.append(time.perf_counter() - started)
+    
+    async def admin():
+        nonlocal reports_done
+        while not done:
+            await adb.get_all_spots_admin()
+            await adb.get_all_bookings()
+            reports_done += 1
+    
+    admins = [asyncio.create_task(admin()) for _ in range(reports)]
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+    done = True
+    await asyncio.gather(*admins)
+    adb.close()
+    adb.database.close()
+    latencies.sort()
+    return elapsed, latencies, reports_done
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--spots", type=int, default=5000)
+    parser.add_argument("--bookings", type=int, default=200000, help="броней в истории")
+    parser.add_argument("--claims", type=int, default=500, help="бронирований за прогон")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--reports", type=int, default=2, help="параллельных отчетов админки")
+    parser.add_argument("--readers", type=int, default=2)
+    args = parser.parse_args()
+    
+    print(f"{'':>24}{'брони/с':>10}{'p50, мс':>10}{'p95, мс':>10}{'p99, мс':>10}{'отчетов':>10}")
+    cases = [
+        ("без отчетов", 0, 0),
+        ("отчеты через воркер", 0, args.reports),
+        (f"пул читателей ({args.readers})", args.readers, args.reports),
+    ]
+    for label, readers, reports in cases:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "bench.db")
+            owner_ids, free_spots = seed(path, args)
+            elapsed, latencies, reports_done = asyncio.run(run(path, args, owner_ids, free_spots, readers, reports))
+        print(f"{label:>24}{len(latencies) / elapsed:>10.0f}"
+              + "".join(f"{percentile(latencies, q) * 1000:>10.1f}" for q in (0.5, 0.95, 0.99))
+              + f"{reports_done:>10}")
+
+
+if __name__ == "__main__":
+    main()
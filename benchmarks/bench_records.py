@@ -0,0 +1,93 @@
+# Списки мест на большой базе: прежний путь (SELECT s.* в sqlite3.Row,
+# fetchall) против проекции столбцов в компактные записи (records.py).
+# Память - tracemalloc: сколько держит готовый список и пик при чтении.
+#
+#   python benchmarks/bench_records.py --spots 100000
+#   python benchmarks/bench_records.py --spots 100000 --runs 5
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database
+
+# Так читал get_spots(available_only=False) до проекций
+ROW_QUERY = '''
+    SELECT s.*, u.full_name as owner_name
+    FROM spots s
+    JOIN users u ON s.owner_id = u.id
+    ORDER BY s.created_at DESC
+'''
+
+
+def seed(path, args):
+    database = Database(path)
+    owner_ids = [database.register_user(10_000_000 + i, f"User {i}") for i in range(args.users)]
+    with database.transaction() as connection:
+        connection.executemany('''
+            INSERT INTO spots (owner_id, spot_number, address, price_per_hour)
+            VALUES (?, ?, ?, ?)
+        ''', ((random.choice(owner_ids), f"A{i}", f"ул. Ленина, д. {i}, подъезд {i % 7 + 1}", random.randint(50, 1000))
+              for i in range(args.spots)))
+    return database
+
+
+def render_rows(spots):
+    # Что делает get_spots_keyboard с каждой строкой
+    return sum(len(f"📍 {spot['spot_number']} - {spot['price_per_hour']}₽/ч view_spot_{spot['id']}") for spot in spots)
+
+
+def render_records(spots):
+    return sum(len(f"📍 {spot.spot_number} - {spot.price_per_hour}₽/ч view_spot_{spot.id}") for spot in spots)
+
+
+def measure(label, load, consume, args):
+    timings = []
+    for _ in range(args.runs):
+        started = time.perf_counter()
+        consume(load())
+        timings.append(time.perf_counter() - started)
+    
+    # Сколько памяти держит результат (список) и пик за время обхода
+    tracemalloc.start()
+    result = consume(load())
+    held, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    elapsed = statistics.median(timings)
+    print(f"{label:>30}{args.spots / elapsed:>12.0f}{elapsed * 1000:>10.1f}"
+          f"{held / 2 ** 20:>12.1f}{peak / 2 ** 20:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--spots", type=int, default=100000)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        database = seed(os.path.join(tmp, "bench.db"), args)
+        connection = database.connection
+        print(f"{'':>30}{'строк/с':>12}{'мс':>10}{'держит, МБ':>12}{'пик, МБ':>10}")
+        rows = lambda: connection.execute(ROW_QUERY).fetchall()
+        records = lambda: database.get_spots(available_only=False)
+        cases = [
+            ("sqlite3.Row, список", rows, lambda spots: spots),
+            ("записи, список", lambda: list(records()), lambda spots: spots),
+            ("sqlite3.Row + клавиатура", rows, render_rows),
+            ("записи + клавиатура, лениво", records, render_records),
+        ]
+        for label, load, consume in cases:
+            measure(label, load, consume, args)
+        database.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+# Время запуска: от начала импорта bot до первого обработанного апдейта.
+# Каждый замер - отдельный процесс, по фазам: импорт, create_app,
+# подключение к базе (миграции или быстрая проверка схемы), прогрев,
+# первый апдейт. Сессия бота - заглушка из bench_dispatcher.
+#
+#   python benchmarks/bench_startup.py --runs 5 --spots 5000
+import argparse
+import json
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+PHASES = ["import", "create_app", "connect", "warm_up", "first_update"]
+
+
+def child(warm_up):
+    import asyncio
+
+    timings = {}
+    started = time.perf_counter()
+
+    def mark(phase):
+        nonlocal started
+        now = time.perf_counter()
+        timings[phase] = now - started
+        started = now
+
+    import bot
+    from bench_dispatcher import RecordingSession, Updates
+    from aiogram.types import Update
+    mark("import")
+
+    async def run():
+        app = bot.create_app(session=RecordingSession())
+        mark("create_app")
+        await bot.adb.call(lambda: bot.db.connection)
+        mark("connect")
+        if warm_up:
+            await bot.warm_up()
+        mark("warm_up")
+        update = Updates().message(1_000_000, "🚗 Найти место")
+        await app.dp.feed_update(app.bot, Update.model_validate(update, context={"bot": app.bot}))
+        mark("first_update")
+        await app.dp.storage.close()
+        bot.adb.close()
+
+    asyncio.run(run())
+    print(json.dumps(timings))
+
+
+def measure(db_path, warm_up):
+    env = dict(os.environ, DB_PATH=db_path, BOT_TOKEN="123456:TEST-TOKEN")
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child"] + (["--warm-up"] if warm_up else []),
+        env=env, capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def seed(db_path, args):
+    from database import Database
+
+    logging.disable(logging.INFO)
+    database = Database(db_path)
+    owner = database.register_user(1_000_000, "Owner")
+    database.add_spots(owner, [(f"A{i}", f"Адрес {i}", 100) for i in range(args.spots)])
+    database.close()
+
+
+def report(name, runs):
+    medians = {phase: statistics.median(run[phase] for run in runs) * 1000 for phase in PHASES}
+    total = sum(medians.values())
+    print(f"{name:<28}" + "".join(f"{medians[phase]:>13.1f}" for phase in PHASES) + f"{total:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--spots", type=int, default=5000)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--warm-up", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args.warm_up)
+        return
+
+    print(f"{'медиана, мс':<28}" + "".join(f"{phase:>13}" for phase in PHASES) + f"{'всего':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        fresh = []
+        for i in range(args.runs):
+            # Пустая база: все миграции при подключении
+            fresh.append(measure(os.path.join(tmp, f"fresh{i}.db"), warm_up=False))
+        report("новая база", fresh)
+
+        db_path = os.path.join(tmp, "bench.db")
+        seed(db_path, args)
+        report("готовая база", [measure(db_path, warm_up=False) for _ in range(args.runs)])
+        report("готовая база + прогрев", [measure(db_path, warm_up=True) for _ in range(args.runs)])
+
+
+if __name__ == "__main__":
+    main()
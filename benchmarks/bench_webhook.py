@@ -0,0 +1,164 @@
+# Нагрузочный тест webhook-режима: поднимает заглушку Bot API, запускает
+# bot.py с WEBHOOK_WORKERS=1 и =N и шлет синтетические апдейты POST-ами.
+#
+#   python benchmarks/bench_webhook.py --updates 5000 --workers 4
+#   python benchmarks/bench_webhook.py --throttle
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import aiohttp
+from aiohttp import web
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from database import Database
+
+TEXTS = ["/start", "🚗 Найти место", "🏠 Мои места", "📋 Мои брони"]
+
+
+# ========== ЗАГЛУШКА BOT API ==========
+async def fake_api(request):
+    method = request.match_info["method"].lower()
+    if method in ("sendmessage", "editmessagetext"):
+        result = {
+            "message_id": random.randint(1, 1_000_000),
+            "date": int(time.time()),
+            "chat": {"id": 1, "type": "private"},
+            "text": "ok",
+        }
+    else:
+        result = True
+    return web.json_response({"ok": True, "result": result})
+
+
+def run_fake_api(port):
+    app = web.Application()
+    app.router.add_post("/bot{token}/{method}", fake_api)
+    web.run_app(app, host="127.0.0.1", port=port, print=None, access_log=None)
+
+
+# ========== НАГРУЗКА ==========
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def make_update(update_id, users):
+    user_id = random.choice(users)
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": f"User{user_id}"},
+            "text": random.choice(TEXTS),
+        },
+    }
+
+
+async def wait_port(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"Порт {port} так и не открылся")
+
+
+async def load(port, args, users):
+    url = f"http://127.0.0.1:{port}/webhook"
+    updates = [make_update(i, users) for i in range(args.updates)]
+    errors = 0
+
+    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=args.concurrency)) as session:
+        async def send(update):
+            nonlocal errors
+            async with session.post(url, json=update) as response:
+                if response.status != 200:
+                    errors += 1
+                await response.read()
+
+        # Прогрев: соединения, кэши, воркеры БД
+        await asyncio.gather(*(send(update) for update in updates[:200]))
+        started = time.perf_counter()
+        await asyncio.gather(*(send(update) for update in updates))
+        elapsed = time.perf_counter() - started
+    return elapsed, errors
+
+
+def run_bot(workers, port, api_port, db_path, throttle):
+    env = dict(
+        os.environ,
+        BOT_TOKEN="123456:TEST-TOKEN",
+        DB_PATH=db_path,
+        TELEGRAM_API_URL=f"http://127.0.0.1:{api_port}",
+        WEBHOOK_URL="http://127.0.0.1",
+        WEBHOOK_HOST="127.0.0.1",
+        WEBHOOK_PORT=str(port),
+        WEBHOOK_WORKERS=str(workers),
+        WEBHOOK_DRAIN_TIMEOUT="5",
+        # Синтетические пользователи кликают быстрее живых - без --throttle
+        # меряем сами хендлеры, а не отказы лимитера
+        THROTTLE="1" if throttle else "0",
+    )
+    return subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "bot.py")],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--updates", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--spots", type=int, default=1000)
+    parser.add_argument("--throttle", action="store_true", help="не отключать лимиты запросов")
+    args = parser.parse_args()
+
+    api_port = free_port()
+    api = multiprocessing.Process(target=run_fake_api, args=(api_port,), daemon=True)
+    api.start()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        database = Database(db_path)
+        users = [1_000_000 + i for i in range(args.users)]
+        owner_ids = [database.register_user(telegram_id, f"User {telegram_id}") for telegram_id in users]
+        for i in range(args.spots):
+            database.add_spot(random.choice(owner_ids), f"A{i}", f"Адрес {i}", 100)
+        database.connection.close()
+
+        for workers in sorted({1, args.workers}):
+            port = free_port()
+            process = run_bot(workers, port, api_port, db_path, args.throttle)
+            try:
+                asyncio.run(wait_port(port))
+                elapsed, errors = asyncio.run(load(port, args, users))
+            finally:
+                process.send_signal(signal.SIGTERM)
+                process.wait(timeout=30)
+            print(f"воркеров: {workers:>2}  {args.updates / elapsed:8.0f} апдейтов/с  "
+                  f"({elapsed:.2f} с, ошибок: {errors})")
+
+    api.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,390 +1,979 @@
-import logging
-from datetime import datetime
-from aiogram import Bot, Dispatcher, F, Router
-from aiogram.types import Message, CallbackQuery, ReplyKeyboardMarkup, KeyboardButton
-from aiogram.filters import Command, CommandStart
-from aiogram.fsm.context import FSMContext
-from aiogram.fsm.state import State, StatesGroup
-from aiogram.utils.keyboard import ReplyKeyboardBuilder, InlineKeyboardBuilder
-from aiogram.types import InlineKeyboardButton
-
-from config import Config
-from database import db
-
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
-
-bot = Bot(token=Config.BOT_TOKEN)
-dp = Dispatcher()
-router = Router()
-
-# ========== СОСТОЯНИЯ ==========
-class AddSpotStates(StatesGroup):
-    waiting_for_number = State()
-    waiting_for_address = State()
-    waiting_for_price = State()
-
-class BookingStates(StatesGroup):
-    waiting_for_hours = State()
-
-# ========== КЛАВИАТУРЫ ==========
-def get_main_menu(user_id=None):
-    builder = ReplyKeyboardBuilder()
-    builder.add(KeyboardButton(text="🚗 Найти место"))
-    builder.add(KeyboardButton(text="🏠 Мои места"))
-    builder.add(KeyboardButton(text="📋 Мои брони"))
-    builder.add(KeyboardButton(text="➕ Выложить место"))
-    if user_id and db.is_admin(user_id):
-        builder.add(KeyboardButton(text="👑 Админ"))
-    builder.adjust(2, 2, 1)
-    return builder.as_markup(resize_keyboard=True)
-
-def get_spots_keyboard(spots):
-    builder = InlineKeyboardBuilder()
-    for spot in spots:
-        builder.add(InlineKeyboardButton(
-            text=f"📍 {spot['spot_number']} - {spot['price_per_hour']}₽/ч",
-            callback_data=f"view_spot_{spot['id']}"
-        ))
-    builder.adjust(1)
-    return builder.as_markup()
-
-# ========== КОМАНДЫ ==========
-@router.message(CommandStart())
-async def start(message: Message):
-    user_id = message.from_user.id
-    full_name = message.from_user.full_name
-    username = message.from_user.username
-    
-    db.register_user(user_id, full_name, username)
-    
-    await message.answer(
-        f"👋 Привет, {full_name}!\n\n"
-        f"Я бот для бронирования парковочных мест.\n\n"
-        f"Что умею:\n"
-        f"• 🚗 Найти свободное место\n"
-        f"• 🏠 Сдать свое место\n"
-        f"• 📋 Управлять бронированиями\n\n"
-        f"Используй кнопки ниже:",
-        reply_markup=get_main_menu(user_id)
-    )
-
-@router.message(Command("admin"))
-async def admin_login(message: Message):
-    parts = message.text.split()
-    if len(parts) == 2 and parts[1] == Config.ADMIN_PASSWORD:
-        user = db.get_user(message.from_user.id)
-        if user:
-            await message.answer(
-                "✅ Вы вошли как администратор!\n"
-                "Теперь у вас есть кнопка '👑 Админ' в меню.",
-                reply_markup=get_main_menu(message.from_user.id)
-            )
-        else:
-            await message.answer("Сначала зарегистрируйтесь через /start")
-    else:
-        await message.answer("Используйте: /admin qwerty123")
-
-# ========== ГЛАВНОЕ МЕНЮ ==========
-@router.message(F.text == "🚗 Найти место")
-async def find_spots(message: Message):
-    spots = db.get_spots(available_only=True)
-    
-    if not spots:
-        await message.answer("😔 Пока нет свободных мест.")
-        return
-    
-    text = "🏠 Доступные места:\n\n"
-    for spot in spots:
-        text += f"📍 <b>{spot['spot_number']}</b>\n"
-        text += f"   Адрес: {spot['address']}\n"
-        text += f"   Цена: {spot['price_per_hour']}₽/час\n"
-        text += f"   Владелец: {spot['owner_name']}\n\n"
-    
-    await message.answer(text, reply_markup=get_spots_keyboard(spots))
-
-@router.message(F.text == "🏠 Мои места")
-async def my_spots(message: Message):
-    user = db.get_user(message.from_user.id)
-    if not user:
-        await message.answer("Сначала зарегистрируйтесь через /start")
-        return
-    
-    spots = db.get_user_spots(user['id'])
-    
-    if not spots:
-        await message.answer("У вас пока нет выложенных мест.")
-        return
-    
-    text = "🏠 Ваши места:\n\n"
-    for spot in spots:
-        status = "✅ Свободно" if spot['is_available'] else "❌ Занято"
-        text += f"📍 <b>{spot['spot_number']}</b>\n"
-        text += f"   Адрес: {spot['address']}\n"
-        text += f"   Цена: {spot['price_per_hour']}₽/час\n"
-        text += f"   Статус: {status}\n\n"
-    
-    await message.answer(text)
-
-@router.message(F.text == "📋 Мои брони")
-async def my_bookings(message: Message):
-    user = db.get_user(message.from_user.id)
-    if not user:
-        await message.answer("Сначала зарегистрируйтесь через /start")
-        return
-    
-    bookings = db.get_user_bookings(user['id'])
-    
-    if not bookings:
-        await message.answer("У вас пока нет бронирований.")
-        return
-    
-    text = "📋 Ваши бронирования:\n\n"
-    for booking in bookings:
-        text += f"📍 <b>{booking['spot_number']}</b>\n"
-        text += f"   Адрес: {booking['address']}\n"
-        text += f"   Часов: {booking['hours']}\n"
-        text += f"   Сумма: {booking['total_price']}₽\n"
-        text += f"   Владелец: {booking['spot_owner']}\n\n"
-    
-    await message.answer(text)
-
-# ========== ВЫЛОЖИТЬ МЕСТО ==========
-@router.message(F.text == "➕ Выложить место")
-async def add_spot_start(message: Message, state: FSMContext):
-    user = db.get_user(message.from_user.id)
-    if not user:
-        await message.answer("Сначала зарегистрируйтесь через /start")
-        return
-    
-    await state.set_state(AddSpotStates.waiting_for_number)
-    await message.answer(
-        "Введите номер места (например: A1, B2, Парковка-1):",
-        reply_markup=ReplyKeyboardMarkup(
-            keyboard=[[KeyboardButton(text="❌ Отмена")]],
-            resize_keyboard=True
-        )
-    )
-
-@router.message(AddSpotStates.waiting_for_number)
-async def process_spot_number(message: Message, state: FSMContext):
-    if message.text == "❌ Отмена":
-        await state.clear()
-        await message.answer("Отменено", reply_markup=get_main_menu(message.from_user.id))
-        return
-    
-    await state.update_data(spot_number=message.text)
-    await state.set_state(AddSpotStates.waiting_for_address)
-    await message.answer("Введите адрес места:")
-
-@router.message(AddSpotStates.waiting_for_address)
-async def process_spot_address(message: Message, state: FSMContext):
-    await state.update_data(address=message.text)
-    await state.set_state(AddSpotStates.waiting_for_price)
-    await message.answer("Введите цену за час (в рублях):")
-
-@router.message(AddSpotStates.waiting_for_price)
-async def process_spot_price(message: Message, state: FSMContext):
-    try:
-        price = int(message.text)
-        if price <= 0:
-            await message.answer("Цена должна быть больше 0. Введите снова:")
-            return
-        
-        data = await state.get_data()
-        user = db.get_user(message.from_user.id)
-        
-        spot_id = db.add_spot(
-            user['id'],
-            data['spot_number'],
-            data['address'],
-            price
-        )
-        
-        await message.answer(
-            f"✅ Место добавлено!\n\n"
-            f"📍 Номер: {data['spot_number']}\n"
-            f"🏠 Адрес: {data['address']}\n"
-            f"💰 Цена: {price}₽/час\n\n"
-            f"Теперь другие пользователи могут его забронировать.",
-            reply_markup=get_main_menu(message.from_user.id)
-        )
-        
-        await state.clear()
-        
-    except ValueError:
-        await message.answer("Введите число (например: 100):")
-
-# ========== БРОНИРОВАНИЕ ==========
-@router.callback_query(F.data.startswith("view_spot_"))
-async def view_spot(callback: CallbackQuery, state: FSMContext):
-    spot_id = int(callback.data.split("_")[2])
-    spot = db.get_spot(spot_id)
-    
-    if not spot:
-        await callback.answer("Место не найдено")
-        return
-    
-    text = f"📍 <b>{spot['spot_number']}</b>\n"
-    text += f"🏠 Адрес: {spot['address']}\n"
-    text += f"💰 Цена: {spot['price_per_hour']}₽/час\n"
-    text += f"👤 Владелец: {spot['owner_name']}\n\n"
-    
-    if spot['is_available']:
-        text += "Для бронирования введите количество часов:"
-        
-        builder = InlineKeyboardBuilder()
-        for hours in [1, 2, 3, 4, 6, 12, 24]:
-            builder.add(InlineKeyboardButton(
-                text=f"{hours} час.",
-                callback_data=f"book_{spot_id}_{hours}"
-            ))
-        builder.adjust(3, 3, 1)
-        
-        await callback.message.edit_text(text, reply_markup=builder.as_markup())
-    else:
-        text += "❌ Это место уже забронировано"
-        await callback.message.edit_text(text)
-    
-    await callback.answer()
-
-@router.callback_query(F.data.startswith("book_"))
-async def book_spot(callback: CallbackQuery):
-    parts = callback.data.split("_")
-    spot_id = int(parts[1])
-    hours = int(parts[2])
-    
-    user = db.get_user(callback.from_user.id)
-    if not user:
-        await callback.answer("Сначала зарегистрируйтесь")
-        return
-    
-    spot = db.get_spot(spot_id)
-    if not spot or not spot['is_available']:
-        await callback.answer("Место уже занято")
-        return
-    
-    booking_id = db.create_booking(user['id'], spot_id, hours)
-    
-    if booking_id:
-        total_price = spot['price_per_hour'] * hours
-        
-        await callback.message.edit_text(
-            f"✅ Вы забронировали место!\n\n"
-            f"📍 {spot['spot_number']}\n"
-            f"🏠 {spot['address']}\n"
-            f"⏰ {hours} часов\n"
-            f"💰 {total_price}₽\n\n"
-            f"Свяжитесь с владельцем для уточнения деталей: @{spot['owner_telegram']}"
-        )
-        
-        # Уведомляем владельца
-        owner = db.get_user(spot['owner_telegram'])
-        if owner:
-            await bot.send_message(
-                chat_id=owner['telegram_id'],
-                text=f"📢 Ваше место забронировано!\n\n"
-                     f"📍 {spot['spot_number']}\n"
-                     f"👤 Клиент: {user['full_name']}\n"
-                     f"⏰ {hours} часов\n"
-                     f"💰 {total_price}₽\n\n"
-                     f"Свяжитесь для подтверждения."
-            )
-    else:
-        await callback.answer("Ошибка бронирования")
-    
-    await callback.answer()
-
-# ========== АДМИН ПАНЕЛЬ ==========
-@router.message(F.text == "👑 Админ")
-async def admin_panel(message: Message):
-    if not db.is_admin(message.from_user.id):
-        await message.answer("❌ Доступ запрещен")
-        return
-    
-    text = "👑 <b>Админ-панель</b>\n\n"
-    text += "Выберите раздел:\n"
-    
-    builder = InlineKeyboardBuilder()
-    builder.add(InlineKeyboardButton(text="👥 Все пользователи", callback_data="admin_users"))
-    builder.add(InlineKeyboardButton(text="🏠 Все места", callback_data="admin_spots"))
-    builder.add(InlineKeyboardButton(text="📋 Все брони", callback_data="admin_bookings"))
-    builder.add(InlineKeyboardButton(text="📊 Статистика", callback_data="admin_stats"))
-    builder.adjust(1)
-    
-    await message.answer(text, reply_markup=builder.as_markup())
-
-@router.callback_query(F.data == "admin_users")
-async def show_all_users(callback: CallbackQuery):
-    users = db.get_all_users()
-    
-    text = "👥 <b>Все пользователи</b>\n\n"
-    for user in users:
-        admin = "👑" if user['is_admin'] else ""
-        text += f"{admin} <b>{user['full_name']}</b>\n"
-        text += f"   ID: {user['telegram_id']}\n"
-        text += f"   @{user['username'] or 'нет'}\n"
-        text += f"   📅 {user['created_at']}\n\n"
-    
-    await callback.message.edit_text(text)
-    await callback.answer()
-
-@router.callback_query(F.data == "admin_spots")
-async def show_all_spots(callback: CallbackQuery):
-    spots = db.get_all_spots_admin()
-    
-    text = "🏠 <b>Все места</b>\n\n"
-    for spot in spots:
-        status = "✅" if spot['is_available'] else "❌"
-        text += f"{status} <b>{spot['spot_number']}</b>\n"
-        text += f"   Адрес: {spot['address']}\n"
-        text += f"   Цена: {spot['price_per_hour']}₽/ч\n"
-        text += f"   Владелец: {spot['owner_name']}\n"
-        text += f"   Бронирований: {spot['bookings_count'] or 0}\n"
-        text += f"   Заработано: {spot['total_earnings'] or 0}₽\n\n"
-    
-    await callback.message.edit_text(text)
-    await callback.answer()
-
-@router.callback_query(F.data == "admin_bookings")
-async def show_all_bookings(callback: CallbackQuery):
-    bookings = db.get_all_bookings()
-    
-    text = "📋 <b>Все бронирования</b>\n\n"
-    for booking in bookings:
-        text += f"📍 <b>{booking['spot_number']}</b>\n"
-        text += f"   Клиент: {booking['client_name']}\n"
-        text += f"   Владелец: {booking['owner_name']}\n"
-        text += f"   Часов: {booking['hours']}\n"
-        text += f"   Сумма: {booking['total_price']}₽\n"
-        text += f"   📅 {booking['created_at']}\n\n"
-    
-    await callback.message.edit_text(text)
-    await callback.answer()
-
-@router.callback_query(F.data == "admin_stats")
-async def show_stats(callback: CallbackQuery):
-    users = db.get_all_users()
-    spots = db.get_all_spots_admin()
-    bookings = db.get_all_bookings()
-    
-    total_earnings = sum(b['total_price'] for b in bookings)
-    
-    text = "📊 <b>Статистика системы</b>\n\n"
-    text += f"👥 Пользователей: {len(users)}\n"
-    text += f"🏠 Мест: {len(spots)}\n"
-    text += f"📋 Бронирований: {len(bookings)}\n"
-    text += f"💰 Общий доход: {total_earnings}₽\n"
-    text += f"👑 Админов: {sum(1 for u in users if u['is_admin'])}\n"
-    
-    await callback.message.edit_text(text)
-    await callback.answer()
-
-# ========== ЗАПУСК ==========
-async def main():
-    dp.include_router(router)
-    await dp.start_polling(bot)
-
-if __name__ == "__main__":
-    import asyncio
-    asyncio.run(main())
\ No newline at end of file
+import asyncio
+import logging
+import math
+import os
+import re
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from aiogram import Bot, Dispatcher, F, Router
+from aiogram.types import Message, CallbackQuery, ReplyKeyboardMarkup, KeyboardButton, BufferedInputFile, FSInputFile
+from aiogram.types import InlineQuery, InlineQueryResultArticle, InputTextMessageContent
+from aiogram.filters import Command, CommandObject, CommandStart, StateFilter
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State, StatesGroup
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.utils.keyboard import ReplyKeyboardBuilder, InlineKeyboardBuilder
+from aiogram.types import InlineKeyboardButton
+
+from cache import MISSING, RenderCache, TTLCache
+from config import Config
+from database import adb, db, CLAIM_INVALID, CLAIM_OK, CLAIM_TAKEN
+from exporter import EXPORT_KINDS, EXPORT_USAGE, export_to_file, parse_export_args
+from fsm_storage import SQLiteStorage
+from importer import ImportFailed, errors_report, import_spots
+from metrics import MetricsServer, metrics
+from middlewares import ApiMetricsMiddleware, HandlerMetricsMiddleware, ThrottlingMiddleware, UserMiddleware
+from notifier import Notifier
+from scheduler import ArchiveScheduler, ExpiryScheduler
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def create_bot(session=None):
+    if session is None and Config.TELEGRAM_API_URL:
+        session = AiohttpSession(api=TelegramAPIServer.from_base(Config.TELEGRAM_API_URL))
+    bot = Bot(token=Config.BOT_TOKEN, session=session)
+    bot.session.middleware(ApiMetricsMiddleware(metrics))
+    return bot
+
+metrics_server = MetricsServer(metrics)
+# Лимиты запросов на пользователя: класс хендлера -> (в секунду, запас).
+# Класс задается флагом throttle у хендлера
+THROTTLE_LIMITS = {
+    "default": (3, 10),
+    # Списки и карточки мест: запрос к базе и сборка экрана
+    "listing": (1, 5),
+    "booking": (0.5, 3),
+    # Inline-поиск: запрос к FTS на каждую набранную букву
+    "search": (2, 10),
+    # Импорт, экспорт, пересчет статистики
+    "heavy": (1 / 30, 2),
+}
+# THROTTLE=0 снимает лимиты, схлопывание одинаковых callback'ов остается
+throttling = ThrottlingMiddleware(
+    THROTTLE_LIMITS if Config.THROTTLE else dict.fromkeys(THROTTLE_LIMITS, (1e9, 1e9)), metrics
+)
+router = Router()
+router.message.middleware(throttling)
+router.callback_query.middleware(throttling)
+router.inline_query.middleware(throttling)
+router.message.middleware(HandlerMetricsMiddleware(metrics))
+router.callback_query.middleware(HandlerMetricsMiddleware(metrics))
+router.inline_query.middleware(HandlerMetricsMiddleware(metrics))
+router.message.middleware(UserMiddleware(adb))
+router.callback_query.middleware(UserMiddleware(adb))
+
+SPOTS_PAGE_SIZE = 10
+SEARCH_LIMIT = 20
+IMPORT_CHUNK_SIZE = 500
+# Больше Bot API скачать не даст
+IMPORT_MAX_FILE_SIZE = 20 * 1024 * 1024
+IMPORT_ERRORS_SHOWN = 10
+# Списки админки показывают только последние записи, все - через /export
+ADMIN_LIST_LIMIT = 20
+MESSAGE_LIMIT = 4096
+BOOKING_HOURS = [1, 2, 3, 4, 6, 12, 24]
+# Окна /free: сегодня, завтра и т.д. по локальному времени сервера
+FREE_DAYS = {"сегодня": 0, "завтра": 1, "послезавтра": 2}
+FREE_USAGE = "Используйте: /free <день> <часы>, например: /free завтра 9-18 или /free 20.10 8-12"
+# "📍 Рядом": сколько мест показать и как далеко искать, метры
+NEARBY_LIMIT = 10
+NEARBY_RADIUS = 20_000
+search_cache = TTLCache(maxsize=1000, ttl=30)
+render_cache = RenderCache(maxsize=512)
+
+# ========== СОСТОЯНИЯ ==========
+class AddSpotStates(StatesGroup):
+    waiting_for_number = State()
+    waiting_for_address = State()
+    waiting_for_price = State()
+    waiting_for_location = State()
+
+class BookingStates(StatesGroup):
+    waiting_for_hours = State()
+
+class ImportStates(StatesGroup):
+    waiting_for_file = State()
+
+# ========== КЛАВИАТУРЫ ==========
+def get_main_menu(user=None):
+    builder = ReplyKeyboardBuilder()
+    builder.add(KeyboardButton(text="🚗 Найти место"))
+    builder.add(KeyboardButton(text="📍 Рядом", request_location=True))
+    builder.add(KeyboardButton(text="🏠 Мои места"))
+    builder.add(KeyboardButton(text="📋 Мои брони"))
+    builder.add(KeyboardButton(text="➕ Выложить место"))
+    if user and user.is_admin:
+        builder.add(KeyboardButton(text="👑 Админ"))
+    builder.adjust(2, 2, 1)
+    return builder.as_markup(resize_keyboard=True)
+
+def get_location_keyboard():
+    return ReplyKeyboardMarkup(
+        keyboard=[
+            [KeyboardButton(text="📍 Отправить геопозицию", request_location=True)],
+            [KeyboardButton(text="Пропустить"), KeyboardButton(text="❌ Отмена")],
+        ],
+        resize_keyboard=True
+    )
+
+def get_spots_keyboard(spots, has_prev=False, has_next=False):
+    builder = InlineKeyboardBuilder()
+    for spot in spots:
+        builder.row(InlineKeyboardButton(
+            text=f"📍 {spot.spot_number} - {spot.price_per_hour}₽/ч",
+            callback_data=f"view_spot_{spot.id}"
+        ))
+    
+    # Курсор страницы - (created_at, id) первой/последней записи
+    nav = []
+    if has_prev:
+        first = spots[0]
+        nav.append(InlineKeyboardButton(
+            text="◀️",
+            callback_data=f"spots_prev_{first.created_at}_{first.id}"
+        ))
+    if has_next:
+        last = spots[-1]
+        nav.append(InlineKeyboardButton(
+            text="▶️",
+            callback_data=f"spots_next_{last.created_at}_{last.id}"
+        ))
+    if nav:
+        builder.row(*nav)
+    return builder.as_markup()
+
+def get_spots_page_text(spots, title="🏠 Доступные места:\n\n"):
+    parts = [title]
+    for spot in spots:
+        parts.append(
+            f"📍 <b>{spot.spot_number}</b>\n"
+            f"   Адрес: {spot.address}\n"
+            f"   Цена: {spot.price_per_hour}₽/час\n"
+            f"   Владелец: {spot.owner_name}\n\n"
+        )
+    return "".join(parts)
+
+# ========== КЭШ ОТРИСОВКИ ==========
+# Готовые экраны кэшируются по версии данных (Database.versions): пока
+# места и брони не менялись, повторные нажатия не трогают базу и не
+# собирают текст заново
+def data_version(*names):
+    return tuple(adb.versions[name] for name in names)
+
+def render_listing(title, parts, total, kind):
+    # Сколько записей влезает в одно сообщение; запас - под подпись
+    shown = []
+    size = len(title) + 200
+    for part in parts:
+        size += len(part)
+        if size > MESSAGE_LIMIT:
+            break
+        shown.append(part)
+    text = title + "".join(shown)
+    if total > len(shown):
+        text += f"Показаны последние {len(shown)} из {total}.\nПолный список: /export {kind}"
+    return text
+
+def get_export_keyboard(kind):
+    builder = InlineKeyboardBuilder()
+    builder.add(InlineKeyboardButton(text="📤 Выгрузить CSV", callback_data=f"export_{kind}"))
+    return builder.as_markup()
+
+async def render_spots_page(cursor=None, backward=False):
+    # (текст, клавиатура) страницы свободных мест или None, если мест нет.
+    # Будущие брони начинаются без смены версии - страница живет до минуты
+    key = ("spots_page", cursor, backward, data_version("spots", "users"), int(time.time()) // 60)
+    page = render_cache.get(key)
+    if page is not MISSING:
+        return page
+    
+    spots, has_more = await adb.get_spots_page(
+        cursor=cursor, backward=backward, limit=SPOTS_PAGE_SIZE
+    )
+    if not spots:
+        page = None
+    else:
+        if cursor is None:
+            has_prev, has_next = False, has_more
+        else:
+            # Листали назад - впереди точно есть страница, и наоборот
+            has_prev = has_more if backward else True
+            has_next = True if backward else has_more
+        page = (get_spots_page_text(spots), get_spots_keyboard(spots, has_prev, has_next))
+    render_cache.set(key, page)
+    return page
+
+# ========== КОМАНДЫ ==========
+@router.message(CommandStart())
+async def start(message: Message):
+    user_id = message.from_user.id
+    full_name = message.from_user.full_name
+    username = message.from_user.username
+    
+    await adb.register_user(user_id, full_name, username)
+    user = await adb.get_user(user_id)
+    
+    await message.answer(
+        f"👋 Привет, {full_name}!\n\n"
+        f"Я бот для бронирования парковочных мест.\n\n"
+        f"Что умею:\n"
+        f"• 🚗 Найти свободное место\n"
+        f"• 🏠 Сдать свое место\n"
+        f"• 📋 Управлять бронированиями\n\n"
+        f"Используй кнопки ниже:",
+        reply_markup=get_main_menu(user)
+    )
+
+@router.message(Command("admin"))
+async def admin_login(message: Message, user=None):
+    parts = message.text.split()
+    if len(parts) == 2 and parts[1] == Config.ADMIN_PASSWORD:
+        if user:
+            await message.answer(
+                "✅ Вы вошли как администратор!\n"
+                "Теперь у вас есть кнопка '👑 Админ' в меню.",
+                reply_markup=get_main_menu(user)
+            )
+        else:
+            await message.answer("Сначала зарегистрируйтесь через /start")
+    else:
+        await message.answer("Используйте: /admin qwerty123")
+
+# ========== РЯДОМ ==========
+def format_distance(meters):
+    if meters < 1000:
+        return f"{round(meters / 10) * 10} м"
+    return f"{meters / 1000:.1f} км"
+
+async def is_nearby_request(message: Message):
+    # Фильтр-корутина: aiogram вызывает ее прямо в цикле событий, а
+    # синхронные фильтры (F.location, F.text == ...) - через пул потоков,
+    # и каждый такой фильтр замедляет все апдейты, которые до него доходят
+    return message.location is not None or message.text == "📍 Рядом"
+
+@router.message(StateFilter(None), is_nearby_request, flags={"throttle": "listing"})
+async def nearby_spots(message: Message):
+    # Геопозиция вне диалогов - кнопка "📍 Рядом" или отправленная вручную;
+    # в диалоге "Выложить место" ее забирает process_spot_location.
+    # Хендлер объявлен раньше кнопок меню, чтобы геопозиция не ждала
+    # проверки каждого F.text-фильтра
+    if not message.location:
+        # Клиенты без кнопок геопозиции (десктоп) присылают просто текст
+        await message.answer("Отправьте геопозицию: 📎 → Геопозиция - и я покажу ближайшие свободные места.")
+        return
+    
+    location = message.location
+    spots = await adb.get_nearby_spots(location.latitude, location.longitude, NEARBY_LIMIT, NEARBY_RADIUS)
+    if not spots:
+        await message.answer(f"😔 В радиусе {NEARBY_RADIUS // 1000} км свободных мест нет.")
+        return
+    
+    parts = ["📍 Ближайшие свободные места:\n\n"]
+    for spot in spots:
+        parts.append(
+            f"📍 <b>{spot.spot_number}</b> - {format_distance(spot.distance)}\n"
+            f"   Адрес: {spot.address}\n"
+            f"   Цена: {spot.price_per_hour}₽/час\n"
+            f"   Владелец: {spot.owner_name}\n\n"
+        )
+    await message.answer("".join(parts), reply_markup=get_spots_keyboard(spots))
+
+# ========== ГЛАВНОЕ МЕНЮ ==========
+@router.message(F.text == "🚗 Найти место", flags={"throttle": "listing"})
+async def find_spots(message: Message):
+    page = await render_spots_page()
+    
+    if not page:
+        await message.answer("😔 Пока нет свободных мест.")
+        return
+    
+    text, markup = page
+    await message.answer(text, reply_markup=markup)
+
+@router.callback_query(F.data.startswith("spots_"), flags={"throttle": "listing"})
+async def spots_page(callback: CallbackQuery):
+    _, direction, created_at, spot_id = callback.data.split("_")
+    page = await render_spots_page(
+        cursor=(created_at, int(spot_id)),
+        backward=direction == "prev"
+    )
+    
+    if not page:
+        await callback.answer("Больше мест нет")
+        return
+    
+    text, markup = page
+    await callback.message.edit_text(text, reply_markup=markup)
+    await callback.answer()
+
+# ========== ПОИСК ==========
+def parse_search_query(text):
+    # "ленина 100-300", "ленина до 200", "центр от 150" -> (слова, мин. цена, макс. цена)
+    words = []
+    min_price = max_price = None
+    tokens = text.split()
+    i = 0
+    while i < len(tokens):
+        token = tokens[i].lower()
+        price_range = re.fullmatch(r"(\d+)-(\d+)", token)
+        if price_range:
+            min_price, max_price = int(price_range[1]), int(price_range[2])
+        elif token in ("до", "от") and i + 1 < len(tokens) and tokens[i + 1].isdigit():
+            if token == "до":
+                max_price = int(tokens[i + 1])
+            else:
+                min_price = int(tokens[i + 1])
+            i += 1
+        else:
+            words.append(tokens[i])
+        i += 1
+    return " ".join(words), min_price, max_price
+
+async def search_spots(text):
+    # Повторные inline-запросы (пользователь допечатывает адрес) берем из кэша
+    query, min_price, max_price = parse_search_query(text)
+    key = (query.lower(), min_price, max_price, data_version("spots"))
+    spots = search_cache.get(key)
+    if spots is MISSING:
+        spots = await adb.search_spots(query, SEARCH_LIMIT, min_price, max_price)
+        search_cache.set(key, spots)
+    return spots
+
+@router.message(Command("find"), flags={"throttle": "listing"})
+async def find_command(message: Message, command: CommandObject):
+    if not command.args:
+        await message.answer("Используйте: /find <адрес или номер> [100-300 | от 100 | до 200]")
+        return
+    
+    spots = await search_spots(command.args)
+    if not spots:
+        await message.answer("😔 Ничего не найдено.")
+        return
+    
+    await message.answer(get_spots_page_text(spots), reply_markup=get_spots_keyboard(spots))
+
+@router.inline_query(flags={"throttle": "search"})
+async def inline_search(inline_query: InlineQuery):
+    spots = await search_spots(inline_query.query) if inline_query.query.strip() else []
+    
+    results = []
+    for spot in spots:
+        results.append(InlineQueryResultArticle(
+            id=str(spot.id),
+            title=f"📍 {spot.spot_number} - {spot.price_per_hour}₽/ч",
+            description=spot.address,
+            input_message_content=InputTextMessageContent(
+                message_text=f"📍 {spot.spot_number}\n"
+                             f"🏠 Адрес: {spot.address}\n"
+                             f"💰 Цена: {spot.price_per_hour}₽/час\n"
+                             f"👤 Владелец: {spot.owner_name}"
+            )
+        ))
+    
+    await inline_query.answer(results, cache_time=30)
+
+# ========== СВОБОДНЫЕ ОКНА ==========
+def parse_window(text, now=None):
+    # "завтра 9-18", "20.10 8:00-12:00", "14-20" (сегодня) -> (начало, конец)
+    # в unix-времени или None. Только целые часы: бронь почасовая
+    now = now or datetime.now()
+    tokens = text.lower().split()
+    day = now.date()
+    if len(tokens) == 2:
+        token = tokens.pop(0)
+        if token in FREE_DAYS:
+            day += timedelta(days=FREE_DAYS[token])
+        else:
+            match = re.fullmatch(r"(\d{1,2})\.(\d{1,2})(?:\.(\d{4}))?", token)
+            if not match:
+                return None
+            try:
+                day = date(int(match[3] or now.year), int(match[2]), int(match[1]))
+                # "05.01" в декабре - это январь следующего года
+                if match[3] is None and day < now.date():
+                    day = day.replace(year=day.year + 1)
+            except ValueError:
+                return None
+    if len(tokens) != 1:
+        return None
+    match = re.fullmatch(r"(\d{1,2})(?::00)?-(\d{1,2})(?::00)?", tokens[0])
+    if not match or not int(match[1]) < int(match[2]) <= 24:
+        return None
+    midnight = datetime.combine(day, datetime.min.time())
+    start = midnight + timedelta(hours=int(match[1]))
+    end = midnight + timedelta(hours=int(match[2]))
+    return int(start.timestamp()), int(end.timestamp())
+
+def format_window(start, end):
+    # "21.10 09:00–18:00", через полночь - с датой конца
+    start, end = datetime.fromtimestamp(start), datetime.fromtimestamp(end)
+    if start.date() == end.date():
+        return f"{start:%d.%m %H:%M}–{end:%H:%M}"
+    return f"{start:%d.%m %H:%M} – {end:%d.%m %H:%M}"
+
+def get_window_keyboard(spots, start, end):
+    # Бронь сразу на все окно: book_<место>_<часы>_<начало>
+    hours = (end - start) // 3600
+    builder = InlineKeyboardBuilder()
+    for spot in spots:
+        builder.row(InlineKeyboardButton(
+            text=f"📍 {spot.spot_number} - {spot.price_per_hour * hours}₽ за {hours} ч",
+            callback_data=f"book_{spot.id}_{hours}_{start}"
+        ))
+    return builder.as_markup()
+
+@router.message(Command("free"), flags={"throttle": "listing"})
+async def free_command(message: Message, command: CommandObject):
+    window = parse_window(command.args or "")
+    if window is None:
+        await message.answer(FREE_USAGE)
+        return
+    start, end = window
+    if start < time.time():
+        await message.answer("Это время уже началось. Выберите окно в будущем или забронируйте через 🚗 Найти место")
+        return
+    
+    spots = await adb.get_free_spots(start, end, SEARCH_LIMIT)
+    if not spots:
+        await message.answer("😔 На это время свободных мест нет.")
+        return
+    
+    await message.answer(
+        get_spots_page_text(spots, f"🕘 Свободно {format_window(start, end)}:\n\n"),
+        reply_markup=get_window_keyboard(spots, start, end)
+    )
+
+@router.message(F.text == "🏠 Мои места", flags={"throttle": "listing"})
+async def my_spots(message: Message, user=None):
+    if not user:
+        await message.answer("Сначала зарегистрируйтесь через /start")
+        return
+    
+    spots = await adb.get_user_spots(user.id)
+    
+    if not spots:
+        await message.answer("У вас пока нет выложенных мест.")
+        return
+    
+    text = "🏠 Ваши места:\n\n"
+    for spot in spots:
+        status = "❌ Занято" if spot.is_busy else "✅ Свободно"
+        text += f"📍 <b>{spot.spot_number}</b>\n"
+        text += f"   Адрес: {spot.address}\n"
+        text += f"   Цена: {spot.price_per_hour}₽/час\n"
+        text += f"   Статус: {status}\n"
+        if spot.active_bookings:
+            text += f"   Броней: {spot.active_bookings}\n"
+        text += "\n"
+    
+    await message.answer(text)
+
+@router.message(F.text == "📋 Мои брони", flags={"throttle": "listing"})
+async def my_bookings(message: Message, user=None):
+    if not user:
+        await message.answer("Сначала зарегистрируйтесь через /start")
+        return
+    
+    bookings = await adb.get_user_bookings(user.id)
+    
+    if not bookings:
+        await message.answer("У вас пока нет бронирований.")
+        return
+    
+    text = "📋 Ваши бронирования:\n\n"
+    for booking in bookings:
+        text += f"📍 <b>{booking.spot_number}</b>\n"
+        text += f"   Адрес: {booking.address}\n"
+        text += f"   Часов: {booking.hours}\n"
+        text += f"   Сумма: {booking.total_price}₽\n"
+        text += f"   Владелец: {booking.spot_owner}\n\n"
+    
+    await message.answer(text)
+
+# ========== ВЫЛОЖИТЬ МЕСТО ==========
+@router.message(F.text == "➕ Выложить место")
+async def add_spot_start(message: Message, state: FSMContext, user=None):
+    if not user:
+        await message.answer("Сначала зарегистрируйтесь через /start")
+        return
+    
+    await state.set_state(AddSpotStates.waiting_for_number)
+    await message.answer(
+        "Введите номер места (например: A1, B2, Парковка-1):",
+        reply_markup=ReplyKeyboardMarkup(
+            keyboard=[[KeyboardButton(text="❌ Отмена")]],
+            resize_keyboard=True
+        )
+    )
+
+@router.message(AddSpotStates.waiting_for_number)
+async def process_spot_number(message: Message, state: FSMContext, user=None):
+    if message.text == "❌ Отмена":
+        await state.clear()
+        await message.answer("Отменено", reply_markup=get_main_menu(user))
+        return
+    
+    await state.update_data(spot_number=message.text)
+    await state.set_state(AddSpotStates.waiting_for_address)
+    await message.answer("Введите адрес места:")
+
+@router.message(AddSpotStates.waiting_for_address)
+async def process_spot_address(message: Message, state: FSMContext):
+    await state.update_data(address=message.text)
+    await state.set_state(AddSpotStates.waiting_for_price)
+    await message.answer("Введите цену за час (в рублях):")
+
+@router.message(AddSpotStates.waiting_for_price)
+async def process_spot_price(message: Message, state: FSMContext):
+    try:
+        price = int(message.text)
+    except (TypeError, ValueError):
+        await message.answer("Введите число (например: 100):")
+        return
+    if price <= 0:
+        await message.answer("Цена должна быть больше 0. Введите снова:")
+        return
+    
+    await state.update_data(price=price)
+    await state.set_state(AddSpotStates.waiting_for_location)
+    await message.answer(
+        "Отправьте геопозицию места - тогда его найдут через «📍 Рядом». "
+        "Или нажмите «Пропустить»:",
+        reply_markup=get_location_keyboard()
+    )
+
+@router.message(AddSpotStates.waiting_for_location)
+async def process_spot_location(message: Message, state: FSMContext, user=None):
+    if message.text == "❌ Отмена":
+        await state.clear()
+        await message.answer("Отменено", reply_markup=get_main_menu(user))
+        return
+    if message.location:
+        latitude, longitude = message.location.latitude, message.location.longitude
+    elif message.text == "Пропустить":
+        latitude = longitude = None
+    else:
+        await message.answer("Отправьте геопозицию кнопкой ниже или нажмите «Пропустить»:")
+        return
+    
+    data = await state.get_data()
+    
+    spot_id = await adb.add_spot(
+        user.id,
+        data['spot_number'],
+        data['address'],
+        data['price'],
+        latitude,
+        longitude
+    )
+    
+    await message.answer(
+        f"✅ Место добавлено!\n\n"
+        f"📍 Номер: {data['spot_number']}\n"
+        f"🏠 Адрес: {data['address']}\n"
+        f"💰 Цена: {data['price']}₽/час\n"
+        f"🗺 Геопозиция: {'указана' if latitude is not None else 'не указана'}\n\n"
+        f"Теперь другие пользователи могут его забронировать.",
+        reply_markup=get_main_menu(user)
+    )
+    
+    await state.clear()
+
+# ========== ИМПОРТ МЕСТ ==========
+@router.message(Command("import"))
+async def import_start(message: Message, state: FSMContext, user=None):
+    if not user:
+        await message.answer("Сначала зарегистрируйтесь через /start")
+        return
+    
+    await state.set_state(ImportStates.waiting_for_file)
+    await message.answer(
+        "Отправьте CSV-файл с местами, по одному в строке:\n"
+        "<code>номер;адрес;цена за час</code>\n\n"
+        "Первая строка может быть заголовком (номер, адрес, цена). "
+        "Разделитель - запятая, точка с запятой или табуляция.",
+        parse_mode="HTML",
+        reply_markup=ReplyKeyboardMarkup(
+            keyboard=[[KeyboardButton(text="❌ Отмена")]],
+            resize_keyboard=True
+        )
+    )
+
+@router.message(ImportStates.waiting_for_file, F.document, flags={"throttle": "heavy"})
+async def import_file(message: Message, state: FSMContext, user=None):
+    document = message.document
+    if document.file_size and document.file_size > IMPORT_MAX_FILE_SIZE:
+        await message.answer("Файл слишком большой, максимум 20 МБ. Разбейте его на части.")
+        return
+    
+    await state.clear()
+    await message.answer("⏳ Загружаю места...")
+    # Файл скачивается на диск и читается построчно - целиком в памяти
+    # его не держим
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "import.csv")
+        await message.bot.download(document, destination=path)
+        try:
+            imported, errors = await import_spots(adb, user.id, path, chunk_size=IMPORT_CHUNK_SIZE)
+        except ImportFailed as e:
+            logger.warning(f"Не удалось прочитать файл импорта: {e}")
+            text = "❌ Не удалось прочитать файл. Нужен CSV в UTF-8 или cp1251."
+            if e.imported:
+                text = (f"❌ Файл не дочитан: ошибка после {e.imported} добавленных мест. "
+                        f"Нужен CSV в UTF-8 или cp1251, уже добавленные места загружать заново не нужно.")
+            await message.answer(text, reply_markup=get_main_menu(user))
+            return
+    
+    text = f"✅ Добавлено мест: {imported}"
+    if errors:
+        text += f"\n❌ Строк с ошибками: {len(errors)}\n\n"
+        text += "\n".join(f"Строка {line}: {error}" for line, error in errors[:IMPORT_ERRORS_SHOWN])
+        if len(errors) > IMPORT_ERRORS_SHOWN:
+            text += "\n..."
+    await message.answer(text, reply_markup=get_main_menu(user))
+    
+    if errors:
+        await message.answer_document(
+            BufferedInputFile(errors_report(errors), filename="import_errors.csv"),
+            caption="Полный список ошибок"
+        )
+
+@router.message(ImportStates.waiting_for_file)
+async def import_waiting(message: Message, state: FSMContext, user=None):
+    if message.text == "❌ Отмена":
+        await state.clear()
+        await message.answer("Отменено", reply_markup=get_main_menu(user))
+        return
+    await message.answer("Отправьте CSV-файл документом или нажмите ❌ Отмена")
+
+# ========== БРОНИРОВАНИЕ ==========
+@router.callback_query(F.data.startswith("view_spot_"), flags={"throttle": "listing"})
+async def view_spot(callback: CallbackQuery, state: FSMContext):
+    spot_id = int(callback.data.split("_")[2])
+    spot = await adb.get_spot(spot_id)
+    
+    if not spot:
+        await callback.answer("Место не найдено")
+        return
+    
+    text = f"📍 <b>{spot.spot_number}</b>\n"
+    text += f"🏠 Адрес: {spot.address}\n"
+    text += f"💰 Цена: {spot.price_per_hour}₽/час\n"
+    text += f"👤 Владелец: {spot.owner_name}\n\n"
+    
+    # Часы, которые помещаются до следующей брони места
+    now = int(time.time())
+    free_until = await adb.get_free_until(spot_id, now)
+    options = [hours for hours in BOOKING_HOURS if now + hours * 3600 <= free_until]
+    if options:
+        if free_until != math.inf:
+            text += f"Свободно до {datetime.fromtimestamp(free_until):%d.%m %H:%M}\n"
+        text += "Для бронирования введите количество часов:"
+        
+        builder = InlineKeyboardBuilder()
+        for hours in options:
+            builder.add(InlineKeyboardButton(
+                text=f"{hours} час.",
+                callback_data=f"book_{spot_id}_{hours}"
+            ))
+        builder.adjust(3, 3, 1)
+        
+        await callback.message.edit_text(text, reply_markup=builder.as_markup())
+    else:
+        text += "❌ Это место сейчас занято\nСвободные окна на другое время: /free"
+        await callback.message.edit_text(text)
+    
+    await callback.answer()
+
+@router.callback_query(F.data.startswith("book_"), flags={"throttle": "booking"})
+async def book_spot(callback: CallbackQuery, notifier: Notifier, scheduler: ExpiryScheduler, user=None):
+    # book_<место>_<часы>[_<начало>]: без начала - с текущего момента
+    parts = callback.data.split("_")
+    spot_id = int(parts[1])
+    hours = int(parts[2])
+    starts_at = int(parts[3]) if len(parts) > 3 else None
+    
+    if not user:
+        await callback.answer("Сначала зарегистрируйтесь")
+        return
+    
+    spot = await adb.get_spot(spot_id)
+    if not spot:
+        await callback.answer("Место не найдено")
+        return
+    
+    if starts_at is not None and starts_at < time.time():
+        await callback.answer("Это время уже началось")
+        return
+    
+    result = await adb.claim_spot(user.id, spot_id, hours, starts_at)
+    
+    if result.status == CLAIM_OK:
+        total_price = result.booking['total_price']
+        window = format_window(result.booking['starts_at'], result.booking['ends_at'])
+        scheduler.add(result.booking['id'], result.booking['ends_at'])
+        
+        await callback.message.edit_text(
+            f"✅ Вы забронировали место!\n\n"
+            f"📍 {spot.spot_number}\n"
+            f"🏠 {spot.address}\n"
+            f"⏰ {window} ({hours} ч)\n"
+            f"💰 {total_price}₽\n\n"
+            f"Свяжитесь с владельцем для уточнения деталей: @{spot.owner_telegram}"
+        )
+        
+        # Уведомляем владельца: только ставим в очередь, отправит Notifier
+        await notifier.enqueue(
+            spot.owner_telegram,
+            f"📢 Ваше место забронировано!\n\n"
+            f"📍 {spot.spot_number}\n"
+            f"👤 Клиент: {user.full_name}\n"
+            f"⏰ {window} ({hours} ч)\n"
+            f"💰 {total_price}₽\n\n"
+            f"Свяжитесь для подтверждения."
+        )
+    elif result.status == CLAIM_TAKEN:
+        await callback.answer("Место уже занято на это время")
+        return
+    elif result.status == CLAIM_INVALID:
+        await callback.answer("Неверная длительность брони")
+        return
+    else:
+        await callback.answer("Место не найдено")
+        return
+    
+    await callback.answer()
+
+# ========== АДМИН ПАНЕЛЬ ==========
+@router.message(F.text == "👑 Админ")
+async def admin_panel(message: Message, user=None):
+    if not user or not user.is_admin:
+        await message.answer("❌ Доступ запрещен")
+        return
+    
+    text = "👑 <b>Админ-панель</b>\n\n"
+    text += "Выберите раздел:\n"
+    
+    builder = InlineKeyboardBuilder()
+    builder.add(InlineKeyboardButton(text="👥 Все пользователи", callback_data="admin_users"))
+    builder.add(InlineKeyboardButton(text="🏠 Все места", callback_data="admin_spots"))
+    builder.add(InlineKeyboardButton(text="📋 Все брони", callback_data="admin_bookings"))
+    builder.add(InlineKeyboardButton(text="📊 Статистика", callback_data="admin_stats"))
+    builder.adjust(1)
+    
+    await message.answer(text, reply_markup=builder.as_markup())
+
+@router.callback_query(F.data == "admin_users", flags={"throttle": "listing"})
+async def show_all_users(callback: CallbackQuery):
+    key = ("admin_users", data_version("users"))
+    text = render_cache.get(key)
+    if text is MISSING:
+        users = await adb.get_all_users(ADMIN_LIST_LIMIT)
+        stats = await adb.get_stats()
+        
+        parts = []
+        for user in users:
+            admin = "👑" if user.is_admin else ""
+            parts.append(
+                f"{admin} <b>{user.full_name}</b>\n"
+                f"   ID: {user.telegram_id}\n"
+                f"   @{user.username or 'нет'}\n"
+                f"   📅 {user.created_at}\n\n"
+            )
+        text = render_listing("👥 <b>Все пользователи</b>\n\n", parts, stats['users'], "users")
+        render_cache.set(key, text)
+    
+    await callback.message.edit_text(text, reply_markup=get_export_keyboard("users"))
+    await callback.answer()
+
+@router.callback_query(F.data == "admin_spots", flags={"throttle": "listing"})
+async def show_all_spots(callback: CallbackQuery):
+    key = ("admin_spots", data_version("users", "spots", "bookings"), int(time.time()) // 60)
+    text = render_cache.get(key)
+    if text is MISSING:
+        spots = await adb.get_all_spots_admin(ADMIN_LIST_LIMIT)
+        stats = await adb.get_stats()
+        
+        parts = []
+        for spot in spots:
+            status = "❌" if spot.is_busy else "✅"
+            parts.append(
+                f"{status} <b>{spot.spot_number}</b>\n"
+                f"   Адрес: {spot.address}\n"
+                f"   Цена: {spot.price_per_hour}₽/ч\n"
+                f"   Владелец: {spot.owner_name}\n"
+                f"   Бронирований: {spot.bookings_count or 0}\n"
+                f"   Заработано: {spot.total_earnings or 0}₽\n\n"
+            )
+        text = render_listing("🏠 <b>Все места</b>\n\n", parts, stats['spots'], "spots")
+        render_cache.set(key, text)
+    
+    await callback.message.edit_text(text, reply_markup=get_export_keyboard("spots"))
+    await callback.answer()
+
+@router.callback_query(F.data == "admin_bookings", flags={"throttle": "listing"})
+async def show_all_bookings(callback: CallbackQuery):
+    key = ("admin_bookings", data_version("users", "bookings"))
+    text = render_cache.get(key)
+    if text is MISSING:
+        bookings = await adb.get_all_bookings(ADMIN_LIST_LIMIT)
+        stats = await adb.get_stats()
+        
+        parts = []
+        for booking in bookings:
+            parts.append(
+                f"📍 <b>{booking.spot_number}</b>\n"
+                f"   Клиент: {booking.client_name}\n"
+                f"   Владелец: {booking.owner_name}\n"
+                f"   Часов: {booking.hours}\n"
+                f"   Сумма: {booking.total_price}₽\n"
+                f"   📅 {booking.created_at}\n\n"
+            )
+        text = render_listing("📋 <b>Все бронирования</b>\n\n", parts, stats['bookings'], "bookings")
+        render_cache.set(key, text)
+    
+    await callback.message.edit_text(text, reply_markup=get_export_keyboard("bookings"))
+    await callback.answer()
+
+# ========== ЭКСПОРТ ==========
+async def send_export(message, kind, filters=None, compress=False):
+    filename = f"{kind}_{datetime.now():%Y%m%d_%H%M%S}.csv" + (".gz" if compress else "")
+    # Выборка и запись файла - в отдельном потоке со своим соединением
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, filename)
+        rows = await asyncio.to_thread(export_to_file, db, kind, path, compress, **(filters or {}))
+        await message.answer_document(FSInputFile(path, filename=filename), caption=f"Строк: {rows}")
+
+@router.message(Command("export"), flags={"throttle": "heavy"})
+async def export_command(message: Message, command: CommandObject, user=None):
+    if not user or not user.is_admin:
+        await message.answer("❌ Доступ запрещен")
+        return
+    
+    parsed = parse_export_args(command.args)
+    if parsed is None:
+        await message.answer(EXPORT_USAGE)
+        return
+    kind, filters, compress = parsed
+    await send_export(message, kind, filters, compress)
+
+@router.callback_query(F.data.startswith("export_"), flags={"throttle": "heavy"})
+async def export_callback(callback: CallbackQuery, user=None):
+    if not user or not user.is_admin:
+        await callback.answer("❌ Доступ запрещен")
+        return
+    
+    kind = callback.data.split("_", 1)[1]
+    if kind not in EXPORT_KINDS:
+        await callback.answer("Неизвестная выгрузка")
+        return
+    await callback.answer("⏳ Готовлю файл...")
+    await send_export(callback.message, kind)
+
+def get_stats_screen(stats):
+    text = "📊 <b>Статистика системы</b>\n\n"
+    text += f"👥 Пользователей: {stats['users']}\n"
+    text += f"🏠 Мест: {stats['spots']}\n"
+    text += f"📋 Бронирований: {stats['bookings']}\n"
+    text += f"💰 Общий доход: {stats['earnings']}₽\n"
+    text += f"👑 Админов: {stats['admins']}\n"
+    
+    builder = InlineKeyboardBuilder()
+    builder.add(InlineKeyboardButton(text="🔄 Пересчитать", callback_data="admin_stats_rebuild"))
+    return text, builder.as_markup()
+
+@router.callback_query(F.data == "admin_stats")
+async def show_stats(callback: CallbackQuery):
+    text, markup = get_stats_screen(await adb.get_stats())
+    await callback.message.edit_text(text, reply_markup=markup)
+    await callback.answer()
+
+@router.callback_query(F.data == "admin_stats_rebuild", flags={"throttle": "heavy"})
+async def rebuild_stats(callback: CallbackQuery, user=None):
+    if not user or not user.is_admin:
+        await callback.answer("❌ Доступ запрещен")
+        return
+    
+    diff = await adb.rebuild_stats()
+    if not diff:
+        # Счетчики не изменились - тот же текст Telegram отверг бы
+        # ("message is not modified")
+        await callback.answer("✅ Счетчики совпадают с данными")
+        return
+    
+    text, markup = get_stats_screen(await adb.get_stats())
+    await callback.message.edit_text(text, reply_markup=markup)
+    await callback.answer(f"Исправлено расхождений: {len(diff)}")
+
+# ========== ЗАПУСК ==========
+class App:
+    # Бот, диспетчер и фоновые службы процесса. Импорт модуля ничего не
+    # создает и не открывает - все собирает create_app() при запуске
+    def __init__(self, bot, dp, notifier, scheduler, archiver):
+        self.bot = bot
+        self.dp = dp
+        self.notifier = notifier
+        self.scheduler = scheduler
+        self.archiver = archiver
+
+def create_app(session=None):
+    # Один раз на процесс: router можно подключить только к одному диспетчеру
+    bot = create_bot(session)
+    notifier = Notifier(bot, adb)
+    scheduler = ExpiryScheduler(adb)
+    archiver = ArchiveScheduler(adb, older_than_days=Config.ARCHIVE_AFTER_DAYS)
+    # Состояния диалогов в базе: переживают рестарт и видны всем воркерам.
+    # notifier и scheduler хендлеры получают аргументами
+    dp = Dispatcher(storage=SQLiteStorage(db), notifier=notifier, scheduler=scheduler)
+    dp.include_router(router)
+    return App(bot, dp, notifier, scheduler, archiver)
+
+async def warm_up():
+    # До первого апдейта: соединение и проверка схемы, админы в кэше
+    # пользователей, брони в индексе свободных окон, места с координатами
+    # в сетке, первая страница свободных мест в кэше экранов
+    started = time.perf_counter()
+    admins = await adb.preload_admins()
+    intervals = await adb.sync_intervals()
+    grid = await adb.sync_grid()
+    await render_spots_page()
+    logger.info(f"Прогрев: админов {admins}, броней в индексе {intervals}, мест в сетке {grid}, "
+                f"первая страница мест, {(time.perf_counter() - started) * 1000:.0f} мс")
+
+async def start_services(app, notifications=True, worker=0):
+    if Config.WARMUP:
+        await warm_up()
+    # При нескольких воркерах outbox разбирает только один из них,
+    # иначе лимиты Telegram считались бы в каждом процессе отдельно.
+    # Архивация тоже нужна в одном экземпляре
+    if notifications:
+        app.notifier.start()
+        app.archiver.start()
+    await app.scheduler.start()
+    if Config.METRICS_PORT:
+        await metrics_server.start(Config.METRICS_HOST, Config.METRICS_PORT + worker)
+
+async def stop_services(app):
+    await metrics_server.stop()
+    await app.archiver.stop()
+    await app.scheduler.stop()
+    await app.notifier.stop()
+    adb.close()
+
+async def main():
+    app = create_app()
+    await start_services(app)
+    try:
+        await app.dp.start_polling(app.bot)
+    finally:
+        await stop_services(app)
+
+if __name__ == "__main__":
+    if Config.WEBHOOK_URL:
+        from webhook import run_webhook
+        run_webhook(create_app(), start_services, stop_services)
+    else:
+        asyncio.run(main())
\ No newline at end of file
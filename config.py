@@ -1,11 +1,40 @@
-import os
-from dotenv import load_dotenv
-
-load_dotenv()
-
-class Config:
-    BOT_TOKEN = os.getenv("BOT_TOKEN")
-    ADMIN_ID = int(os.getenv("ADMIN_ID", 7884533080))
-    ADMIN_PASSWORD = "qwerty123"
-
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+class Config:
+    BOT_TOKEN = os.getenv("BOT_TOKEN")
+    ADMIN_ID = int(os.getenv("ADMIN_ID", 7884533080))
+    ADMIN_PASSWORD = "qwerty123"
+    DB_PATH = os.getenv("DB_PATH", "data/parking.db")
+    # Архив старых бронирований: по умолчанию папка archive рядом с базой
+    ARCHIVE_DIR = os.getenv("ARCHIVE_DIR")
+    ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", 90))
+    # Прогрев кэшей перед приемом апдейтов (WARMUP=0 - отключить)
+    WARMUP = os.getenv("WARMUP", "1") != "0"
+    # Лимиты запросов на пользователя (THROTTLE=0 - снять, для нагрузочных тестов)
+    THROTTLE = os.getenv("THROTTLE", "1") != "0"
+    # Свой Bot API сервер (или заглушка для нагрузочных тестов)
+    TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL")
+    
+    # Webhook: если WEBHOOK_URL не задан, бот работает через polling
+    WEBHOOK_URL = os.getenv("WEBHOOK_URL")
+    WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+    WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+    WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+    WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", 8080))
+    WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", os.cpu_count() or 1))
+    # Сколько секунд ждать обработку текущих апдейтов при остановке
+    WEBHOOK_DRAIN_TIMEOUT = float(os.getenv("WEBHOOK_DRAIN_TIMEOUT", 30))
+    
+    # Метрики Prometheus: 0 - не поднимать сервер. Воркер N webhook-режима
+    # слушает METRICS_PORT + N
+    METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+    METRICS_PORT = int(os.getenv("METRICS_PORT", 0))
+    # Запросы к базе дольше порога попадают в лог
+    SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", 100))
+    # Соединения только для чтения под отчеты админки (0 - без пула)
+    DB_READERS = int(os.getenv("DB_READERS", 2))
+
 config = Config()
\ No newline at end of file
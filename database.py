@@ -1,214 +1,1174 @@
-import sqlite3
-import logging
-from datetime import datetime
-
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
-
-class Database:
-    def __init__(self, db_path="data/parking.db"):
-        self.db_path = db_path
-        self.connection = None
-        self.connect()
-        self.create_tables()
-    
-    def connect(self):
-        self.connection = sqlite3.connect(self.db_path, check_same_thread=False)
-        self.connection.row_factory = sqlite3.Row
-    
-    def create_tables(self):
-        cursor = self.connection.cursor()
-        
-        # Пользователи
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                telegram_id INTEGER UNIQUE NOT NULL,
-                username TEXT,
-                full_name TEXT NOT NULL,
-                phone TEXT,
-                car_plate TEXT,
-                is_admin BOOLEAN DEFAULT 0,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # Парковочные места
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS spots (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                owner_id INTEGER NOT NULL,
-                spot_number TEXT NOT NULL,
-                address TEXT NOT NULL,
-                price_per_hour INTEGER NOT NULL,
-                is_available BOOLEAN DEFAULT 1,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (owner_id) REFERENCES users(id)
-            )
-        ''')
-        
-        # Бронирования
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS bookings (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                spot_id INTEGER NOT NULL,
-                hours INTEGER NOT NULL,
-                total_price INTEGER NOT NULL,
-                status TEXT DEFAULT 'active',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users(id),
-                FOREIGN KEY (spot_id) REFERENCES spots(id)
-            )
-        ''')
-        
-        # Создаем админа
-        cursor.execute("SELECT * FROM users WHERE telegram_id = ?", (7884533080,))
-        if not cursor.fetchone():
-            cursor.execute('''
-                INSERT INTO users (telegram_id, full_name, is_admin)
-                VALUES (?, ?, ?)
-            ''', (7884533080, "Администратор", 1))
-        
-        self.connection.commit()
-    
-    # ========== ПОЛЬЗОВАТЕЛИ ==========
-    def register_user(self, telegram_id, full_name, username=None):
-        cursor = self.connection.cursor()
-        cursor.execute('''
-            INSERT OR REPLACE INTO users (telegram_id, username, full_name)
-            VALUES (?, ?, ?)
-        ''', (telegram_id, username, full_name))
-        self.connection.commit()
-        return cursor.lastrowid
-    
-    def get_user(self, telegram_id):
-        cursor = self.connection.cursor()
-        cursor.execute("SELECT * FROM users WHERE telegram_id = ?", (telegram_id,))
-        return cursor.fetchone()
-    
-    def is_admin(self, telegram_id):
-        user = self.get_user(telegram_id)
-        return user and user['is_admin']
-    
-    # ========== МЕСТА ==========
-    def add_spot(self, owner_id, spot_number, address, price_per_hour):
-        cursor = self.connection.cursor()
-        cursor.execute('''
-            INSERT INTO spots (owner_id, spot_number, address, price_per_hour)
-            VALUES (?, ?, ?, ?)
-        ''', (owner_id, spot_number, address, price_per_hour))
-        self.connection.commit()
-        return cursor.lastrowid
-    
-    def get_spots(self, available_only=True):
-        cursor = self.connection.cursor()
-        if available_only:
-            cursor.execute('''
-                SELECT s.*, u.full_name as owner_name 
-                FROM spots s 
-                JOIN users u ON s.owner_id = u.id 
-                WHERE s.is_available = 1
-                ORDER BY s.created_at DESC
-            ''')
-        else:
-            cursor.execute('''
-                SELECT s.*, u.full_name as owner_name 
-                FROM spots s 
-                JOIN users u ON s.owner_id = u.id 
-                ORDER BY s.created_at DESC
-            ''')
-        return cursor.fetchall()
-    
-    def get_spot(self, spot_id):
-        cursor = self.connection.cursor()
-        cursor.execute('''
-            SELECT s.*, u.full_name as owner_name, u.telegram_id as owner_telegram
-            FROM spots s 
-            JOIN users u ON s.owner_id = u.id 
-            WHERE s.id = ?
-        ''', (spot_id,))
-        return cursor.fetchone()
-    
-    def get_user_spots(self, owner_id):
-        cursor = self.connection.cursor()
-        cursor.execute('''
-            SELECT * FROM spots 
-            WHERE owner_id = ? 
-            ORDER BY created_at DESC
-        ''', (owner_id,))
-        return cursor.fetchall()
-    
-    # ========== БРОНИРОВАНИЯ ==========
-    def create_booking(self, user_id, spot_id, hours):
-        spot = self.get_spot(spot_id)
-        if not spot:
-            return None
-        
-        total_price = spot['price_per_hour'] * hours
-        
-        cursor = self.connection.cursor()
-        cursor.execute('''
-            INSERT INTO bookings (user_id, spot_id, hours, total_price)
-            VALUES (?, ?, ?, ?)
-        ''', (user_id, spot_id, hours, total_price))
-        
-        # Помечаем место как занятое
-        cursor.execute('''
-            UPDATE spots SET is_available = 0 WHERE id = ?
-        ''', (spot_id,))
-        
-        self.connection.commit()
-        return cursor.lastrowid
-    
-    def get_user_bookings(self, user_id):
-        cursor = self.connection.cursor()
-        cursor.execute('''
-            SELECT b.*, s.spot_number, s.address, s.price_per_hour,
-                   u.full_name as spot_owner
-            FROM bookings b
-            JOIN spots s ON b.spot_id = s.id
-            JOIN users u ON s.owner_id = u.id
-            WHERE b.user_id = ?
-            ORDER BY b.created_at DESC
-        ''', (user_id,))
-        return cursor.fetchall()
-    
-    def get_all_bookings(self):
-        cursor = self.connection.cursor()
-        cursor.execute('''
-            SELECT b.*, 
-                   u1.full_name as client_name,
-                   s.spot_number, s.address,
-                   u2.full_name as owner_name
-            FROM bookings b
-            JOIN users u1 ON b.user_id = u1.id
-            JOIN spots s ON b.spot_id = s.id
-            JOIN users u2 ON s.owner_id = u2.id
-            ORDER BY b.created_at DESC
-        ''')
-        return cursor.fetchall()
-    
-    # ========== АДМИН СТАТИСТИКА ==========
-    def get_all_users(self):
-        cursor = self.connection.cursor()
-        cursor.execute('''
-            SELECT * FROM users ORDER BY created_at DESC
-        ''')
-        return cursor.fetchall()
-    
-    def get_all_spots_admin(self):
-        cursor = self.connection.cursor()
-        cursor.execute('''
-            SELECT s.*, u.full_name as owner_name, 
-                   COUNT(b.id) as bookings_count,
-                   SUM(b.total_price) as total_earnings
-            FROM spots s
-            LEFT JOIN users u ON s.owner_id = u.id
-            LEFT JOIN bookings b ON s.id = b.spot_id
-            GROUP BY s.id
-            ORDER BY s.created_at DESC
-        ''')
-        return cursor.fetchall()
-
-db = Database()
\ No newline at end of file
+import asyncio
+import os
+import queue
+import re
+import reprlib
+import sqlite3
+import logging
+import multiprocessing
+import threading
+import time
+from collections import namedtuple
+from collections.abc import Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from itertools import count, islice
+from datetime import datetime
+
+from cache import MISSING, TTLCache
+from config import Config
+import geo
+from intervals import IntervalIndex
+from metrics import metrics
+from migrations import apply_migrations, schema_is_current
+from records import AdminBooking, AdminSpot, NearSpot, OwnSpot, SpotCard, SpotItem, User, UserBooking
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Результат захвата места: status - одна из констант CLAIM_*,
+# booking - строка брони (только для CLAIM_OK)
+CLAIM_OK = "ok"
+CLAIM_TAKEN = "taken"
+CLAIM_NOT_FOUND = "not_found"
+# Неположительная длительность: hours приходит из callback_data
+CLAIM_INVALID = "invalid"
+ClaimResult = namedtuple("ClaimResult", ["status", "booking"])
+
+class Versions:
+    # Версии данных для кэшей отрисовки: растут при каждом изменении
+    NAMES = ("users", "spots", "bookings", "fsm")
+    shared = False
+    
+    def __init__(self):
+        self._values = dict.fromkeys(self.NAMES, 0)
+    
+    def __getitem__(self, name):
+        return self._values[name]
+    
+    def increment(self, name):
+        self._values[name] += 1
+        return self._values[name]
+
+class SharedVersions(Versions):
+    # Те же версии в разделяемой памяти: создаются в мастер-процессе до
+    # fork, изменения в любом воркере видны всем остальным
+    shared = True
+    
+    def __init__(self):
+        self._values = multiprocessing.Array("q", len(self.NAMES))
+    
+    def __getitem__(self, name):
+        return self._values[self.NAMES.index(name)]
+    
+    def increment(self, name):
+        index = self.NAMES.index(name)
+        with self._values.get_lock():
+            self._values[index] += 1
+            return self._values[index]
+
+class Database:
+    # Сколько совпадений FTS5 еще можно ранжировать по bm25
+    SEARCH_RANK_LIMIT = 1000
+    
+    # Место свободно прямо сейчас: нет активной брони, накрывающей текущий
+    # момент (idx_bookings_active_spot). Параметры: (now, now)
+    FREE_NOW = '''
+        NOT EXISTS (
+            SELECT 1 FROM bookings b
+            WHERE b.spot_id = s.id AND b.status = 'active'
+              AND b.starts_at <= ? AND b.ends_at > ?
+        )
+    '''
+    
+    def __init__(self, db_path=None, archive_dir=None):
+        self.db_path = db_path or Config.DB_PATH
+        # Помесячные файлы архива бронирований - рядом с основной базой
+        self.archive_dir = archive_dir or Config.ARCHIVE_DIR or os.path.join(
+            os.path.dirname(self.db_path) or ".", "archive"
+        )
+        self._connection = None
+        self._savepoints = count()
+        # Кэш пользователей по telegram_id; сбрасывается при регистрации
+        # и изменении прав
+        self.user_cache = TTLCache(maxsize=10000, ttl=300)
+        self.versions = Versions()
+        self._pending_versions = set()
+        # Брони-интервалы для поиска свободных окон; догружаются из базы
+        # при смене версии bookings
+        self.intervals = IntervalIndex()
+        self._intervals_version = None
+        # Места с координатами для поиска рядом; догружаются при смене
+        # версии spots
+        self.grid = geo.GridIndex()
+        self._grid_version = None
+    
+    @property
+    def connection(self):
+        # Соединение открывается при первом запросе, а не при создании
+        # объекта: импорт модуля не трогает диск
+        if self._connection is None:
+            self.connect()
+        return self._connection
+    
+    def connect(self):
+        # isolation_level=None: транзакции открываем явно через transaction()
+        self._connection = sqlite3.connect(
+            self.db_path, check_same_thread=False, isolation_level=None
+        )
+        self._connection.row_factory = sqlite3.Row
+        # WAL: читатели не блокируют писателя, fsync только на checkpoint
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        # Схема уже последней версии - ни DDL, ни проверки админа
+        if not schema_is_current(self._connection):
+            self.create_tables()
+    
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+    
+    def bump_version(self, *names):
+        # Внутри транзакции версии растут только после COMMIT: иначе другой
+        # процесс успеет закэшировать старые данные под новой версией
+        if self.connection.in_transaction:
+            self._pending_versions.update(names)
+            return
+        for name in names:
+            self.versions.increment(name)
+    
+    def flush_versions(self, committed=True):
+        names, self._pending_versions = self._pending_versions, set()
+        if committed:
+            for name in names:
+                self.versions.increment(name)
+    
+    @contextmanager
+    def transaction(self):
+        # BEGIN IMMEDIATE сразу берет блокировку на запись, поэтому
+        # конкурирующие писатели ждут на входе, а не падают на COMMIT.
+        # Внутри уже открытой транзакции работаем через SAVEPOINT.
+        if self.connection.in_transaction:
+            name = f"sp_{next(self._savepoints)}"
+            self.connection.execute(f"SAVEPOINT {name}")
+            try:
+                yield self.connection
+            except BaseException:
+                self.connection.execute(f"ROLLBACK TO {name}")
+                self.connection.execute(f"RELEASE {name}")
+                raise
+            self.connection.execute(f"RELEASE {name}")
+        else:
+            self.connection.execute("BEGIN IMMEDIATE")
+            try:
+                yield self.connection
+            except BaseException:
+                self.connection.rollback()
+                self.flush_versions(committed=False)
+                raise
+            self.connection.commit()
+            self.flush_versions()
+    
+    def _records(self, record, query, params=(), connection=None):
+        # Ленивый итератор записей: курсор отдает кортежи, и они сразу
+        # становятся record - без sqlite3.Row и промежуточного списка.
+        # Запрос выполняется при вызове, строки читаются по мере обхода
+        cursor = (connection or self.connection).cursor()
+        cursor.row_factory = None
+        cursor.execute(query, params)
+        return map(record._make, cursor)
+    
+    def _record(self, record, query, params=(), connection=None):
+        return next(self._records(record, query, params, connection), None)
+    
+    def create_tables(self):
+        apply_migrations(self.connection)
+        cursor = self.connection.cursor()
+        
+        # Создаем админа
+        cursor.execute("SELECT * FROM users WHERE telegram_id = ?", (7884533080,))
+        if not cursor.fetchone():
+            cursor.execute('''
+                INSERT INTO users (telegram_id, full_name, is_admin)
+                VALUES (?, ?, ?)
+            ''', (7884533080, "Администратор", 1))
+    
+    # ========== ПОЛЬЗОВАТЕЛИ ==========
+    def register_user(self, telegram_id, full_name, username=None):
+        # UPSERT, а не INSERT OR REPLACE: REPLACE удаляет строку и выдает
+        # пользователю новый id, теряя is_admin и связь с его местами
+        # Строка, которая не изменилась, не обновляется и RETURNING ее не
+        # возвращает: повторный /start не сбрасывает версию users, а с ней
+        # и кэш пользователей во всех воркерах
+        cursor = self.connection.cursor()
+        cursor.execute('''
+            INSERT INTO users (telegram_id, username, full_name)
+            VALUES (?, ?, ?)
+            ON CONFLICT(telegram_id) DO UPDATE SET
+                username = excluded.username,
+                full_name = excluded.full_name
+            WHERE username IS NOT excluded.username OR full_name IS NOT excluded.full_name
+            RETURNING id, telegram_id, username, full_name, is_admin, created_at
+        ''', (telegram_id, username, full_name))
+        row = cursor.fetchone()
+        cursor.close()
+        if row is None:
+            return self.get_user(telegram_id).id
+        
+        user = User._make(row)
+        self.bump_version("users")
+        if self.connection.in_transaction:
+            # Внутри пакета group commit версия вырастет только на COMMIT -
+            # запись с текущей версией сразу устарела бы
+            self.user_cache.pop(telegram_id)
+        else:
+            self.user_cache.set(telegram_id, (self.versions["users"], user))
+        return user.id
+    
+    def cached_user(self, telegram_id):
+        # Пользователь из кэша или MISSING - без обращения к базе, поэтому
+        # вызывается и из event loop (у TTLCache своя блокировка).
+        # Запись кэша помечена версией users: когда версии общие для
+        # нескольких процессов, чужая регистрация или смена прав делает
+        # закэшированные строки недействительными
+        cached = self.user_cache.get(telegram_id)
+        if cached is not MISSING:
+            version, user = cached
+            if not self.versions.shared or version == self.versions["users"]:
+                return user
+        return MISSING
+    
+    def get_user(self, telegram_id):
+        user = self.cached_user(telegram_id)
+        if user is not MISSING:
+            return user
+        
+        version = self.versions["users"]
+        user = self._record(User, '''
+            SELECT id, telegram_id, username, full_name, is_admin, created_at
+            FROM users WHERE telegram_id = ?
+        ''', (telegram_id,))
+        self.user_cache.set(telegram_id, (version, user))
+        return user
+    
+    def preload_admins(self):
+        # Прогрев кэша пользователей перед стартом: админы чаще всех ходят
+        # по тяжелым экранам. Возвращает число админов
+        version = self.versions["users"]
+        admins = 0
+        for user in self._records(User, '''
+            SELECT id, telegram_id, username, full_name, is_admin, created_at
+            FROM users WHERE is_admin = 1
+        '''):
+            self.user_cache.set(user.telegram_id, (version, user))
+            admins += 1
+        return admins
+    
+    def is_admin(self, telegram_id):
+        user = self.get_user(telegram_id)
+        return user and user['is_admin']
+    
+    def set_admin(self, telegram_id, is_admin=True):
+        cursor = self.connection.cursor()
+        cursor.execute(
+            "UPDATE users SET is_admin = ? WHERE telegram_id = ?",
+            (1 if is_admin else 0, telegram_id)
+        )
+        self.user_cache.pop(telegram_id)
+        self.bump_version("users")
+        return cursor.rowcount > 0
+    
+    # ========== МЕСТА ==========
+    def add_spot(self, owner_id, spot_number, address, price_per_hour, latitude=None, longitude=None):
+        # Координаты необязательны: без них место не находится через "Рядом"
+        geo_cell = geo.cell_id(latitude, longitude) if latitude is not None else None
+        cursor = self.connection.cursor()
+        cursor.execute('''
+            INSERT INTO spots (owner_id, spot_number, address, price_per_hour, latitude, longitude, geo_cell)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (owner_id, spot_number, address, price_per_hour, latitude, longitude, geo_cell))
+        self.bump_version("spots")
+        return cursor.lastrowid
+    
+    def add_spots(self, owner_id, spots):
+        # Пакетная вставка для импорта: spots - список (номер, адрес, цена),
+        # одна транзакция и один executemany на весь пакет
+        with self.transaction() as connection:
+            connection.executemany('''
+                INSERT INTO spots (owner_id, spot_number, address, price_per_hour)
+                VALUES (?, ?, ?, ?)
+            ''', [(owner_id, *spot) for spot in spots])
+            self.bump_version("spots")
+        return len(spots)
+    
+    # Столбцы SpotItem
+    SPOT_ITEM = "s.id, s.spot_number, s.address, s.price_per_hour, u.full_name as owner_name, s.created_at"
+    
+    def get_spots(self, available_only=True):
+        # available_only - выставленные и не занятые прямо сейчас
+        if available_only:
+            now = int(time.time())
+            return self._records(SpotItem, f'''
+                SELECT {self.SPOT_ITEM}
+                FROM spots s 
+                JOIN users u ON s.owner_id = u.id 
+                WHERE s.is_available = 1 AND {self.FREE_NOW}
+                ORDER BY s.created_at DESC
+            ''', (now, now))
+        return self._records(SpotItem, f'''
+            SELECT {self.SPOT_ITEM}
+            FROM spots s 
+            JOIN users u ON s.owner_id = u.id 
+            ORDER BY s.created_at DESC
+        ''')
+    
+    def get_spots_page(self, cursor=None, backward=False, limit=10):
+        # Keyset-пагинация по (created_at, id): cursor - ключ крайней записи
+        # соседней страницы, читаем только limit + 1 строк
+        query = f'''
+            SELECT {self.SPOT_ITEM}
+            FROM spots s 
+            JOIN users u ON s.owner_id = u.id 
+            WHERE s.is_available = 1 AND {self.FREE_NOW}
+        '''
+        now = int(time.time())
+        params = [now, now]
+        if cursor:
+            query += " AND (s.created_at, s.id) > (?, ?)" if backward else " AND (s.created_at, s.id) < (?, ?)"
+            params.extend(cursor)
+        order = "ASC" if backward else "DESC"
+        query += f" ORDER BY s.created_at {order}, s.id {order} LIMIT ?"
+        params.append(limit + 1)
+        
+        rows = list(self._records(SpotItem, query, params))
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        if backward:
+            rows.reverse()
+        return rows, has_more
+    
+    def search_spots(self, query, limit=20, min_price=None, max_price=None):
+        # Поиск свободных мест по FTS5-индексу, лучшие совпадения (bm25) первыми.
+        # Каждое слово запроса ищется как префикс: "лен 1" найдет "Ленина, 12"
+        words = re.findall(r"\w+", query.lower())
+        if not words:
+            return []
+        match = " ".join(f'"{word}"*' for word in words)
+        
+        sql = f'''
+            SELECT {self.SPOT_ITEM}
+            FROM spots_fts f
+            JOIN spots s ON s.id = f.rowid
+            JOIN users u ON s.owner_id = u.id
+            WHERE spots_fts MATCH ? AND s.is_available = 1 AND {self.FREE_NOW}
+        '''
+        now = int(time.time())
+        params = [match, now, now]
+        if min_price is not None:
+            sql += " AND s.price_per_hour >= ?"
+            params.append(min_price)
+        if max_price is not None:
+            sql += " AND s.price_per_hour <= ?"
+            params.append(max_price)
+        # bm25 считается для каждого совпадения: на запросах вроде "ул"
+        # это десятки тысяч строк, и сортировка по релевантности бессмысленна.
+        # Для широких запросов отдаем новые места первыми (порядок rowid в FTS5)
+        cursor = self.connection.cursor()
+        cursor.execute(
+            "SELECT COUNT(*) FROM (SELECT 1 FROM spots_fts WHERE spots_fts MATCH ? LIMIT ?)",
+            (match, self.SEARCH_RANK_LIMIT + 1)
+        )
+        if cursor.fetchone()[0] > self.SEARCH_RANK_LIMIT:
+            sql += " ORDER BY f.rowid DESC LIMIT ?"
+        else:
+            sql += " ORDER BY f.rank LIMIT ?"
+        params.append(limit)
+        return self._records(SpotItem, sql, params)
+    
+    def get_spot(self, spot_id):
+        return self._record(SpotCard, '''
+            SELECT s.id, s.spot_number, s.address, s.price_per_hour,
+                   u.full_name as owner_name, u.telegram_id as owner_telegram
+            FROM spots s 
+            JOIN users u ON s.owner_id = u.id 
+            WHERE s.id = ?
+        ''', (spot_id,))
+    
+    def get_user_spots(self, owner_id):
+        # is_busy - занято прямо сейчас, active_bookings - текущие и будущие брони
+        now = int(time.time())
+        return self._records(OwnSpot, f'''
+            SELECT s.id, s.spot_number, s.address, s.price_per_hour,
+                   NOT {self.FREE_NOW} as is_busy,
+                   (SELECT COUNT(*) FROM bookings b
+                    WHERE b.spot_id = s.id AND b.status = 'active') as active_bookings
+            FROM spots s
+            WHERE s.owner_id = ? 
+            ORDER BY s.created_at DESC
+        ''', (now, now, owner_id))
+    
+    # ========== БРОНИРОВАНИЯ ==========
+    def claim_spot(self, user_id, spot_id, hours, starts_at=None):
+        # Атомарный захват места на [starts_at, starts_at + hours): бронь
+        # создается, только если окно не пересекается с активными бронями
+        # места. Проверка и вставка - в одной транзакции BEGIN IMMEDIATE,
+        # поэтому гонка двух пользователей дает одному CLAIM_OK, другому
+        # CLAIM_TAKEN. starts_at=None - с текущего момента
+        if hours <= 0:
+            # Иначе ends_at < starts_at и отрицательная сумма: такая бронь
+            # ни с чем не пересекается, а триггер вычел бы ее из дохода
+            return ClaimResult(CLAIM_INVALID, None)
+        if starts_at is None:
+            starts_at = int(time.time())
+        ends_at = starts_at + hours * 3600
+        with self.transaction() as connection:
+            spot = connection.execute(
+                "SELECT price_per_hour FROM spots WHERE id = ? AND is_available = 1", (spot_id,)
+            ).fetchone()
+            if spot is None:
+                return ClaimResult(CLAIM_NOT_FOUND, None)
+            overlap = connection.execute('''
+                SELECT 1 FROM bookings
+                WHERE spot_id = ? AND status = 'active'
+                  AND starts_at < ? AND ends_at > ?
+                LIMIT 1
+            ''', (spot_id, ends_at, starts_at)).fetchone()
+            if overlap:
+                return ClaimResult(CLAIM_TAKEN, None)
+            
+            booking = connection.execute('''
+                INSERT INTO bookings (user_id, spot_id, hours, total_price, starts_at, ends_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                RETURNING *
+            ''', (
+                user_id, spot_id, hours, spot['price_per_hour'] * hours,
+                starts_at, ends_at
+            )).fetchall()
+        self.bump_version("spots", "bookings")
+        return ClaimResult(CLAIM_OK, booking[0])
+    
+    def create_booking(self, user_id, spot_id, hours, starts_at=None):
+        result = self.claim_spot(user_id, spot_id, hours, starts_at)
+        if result.status != CLAIM_OK:
+            return None
+        return result.booking['id']
+    
+    def get_active_expiries(self):
+        # (id, ends_at) активных броней - целиком из частичного индекса
+        cursor = self.connection.cursor()
+        cursor.execute('''
+            SELECT id, ends_at FROM bookings
+            WHERE status = 'active' AND ends_at IS NOT NULL
+        ''')
+        return [(row['ends_at'], row['id']) for row in cursor]
+    
+    def complete_bookings(self, booking_ids):
+        # Завершает истекшие брони. Возвращает id освободившихся мест
+        freed = set()
+        with self.transaction() as connection:
+            for i in range(0, len(booking_ids), 500):
+                chunk = booking_ids[i:i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                freed.update(row['spot_id'] for row in connection.execute(f'''
+                    UPDATE bookings SET status = 'completed'
+                    WHERE id IN ({placeholders}) AND status = 'active'
+                    RETURNING spot_id
+                ''', chunk).fetchall())
+        self.bump_version("spots", "bookings")
+        return list(freed)
+    
+    # ========== СВОБОДНЫЕ ОКНА ==========
+    def sync_intervals(self):
+        # Догружает в индекс брони, созданные после прошлой синхронизации,
+        # в том числе другими процессами (версии общие). Первый вызов
+        # читает все активные брони. Возвращает размер индекса
+        version = self.versions["bookings"]
+        if version == self._intervals_version:
+            return len(self.intervals)
+        last_id = self.connection.execute("SELECT COALESCE(MAX(id), 0) FROM bookings").fetchone()[0]
+        rows = self.connection.execute('''
+            SELECT spot_id, starts_at, ends_at FROM bookings
+            WHERE id > ? AND id <= ? AND status = 'active'
+        ''', (self.intervals.last_id, last_id))
+        self.intervals.extend(rows)
+        self.intervals.last_id = last_id
+        self.intervals.prune(int(time.time()))
+        self._intervals_version = version
+        return len(self.intervals)
+    
+    def get_free_until(self, spot_id, moment=None):
+        # До какого момента место свободно (см. IntervalIndex.free_until)
+        self.sync_intervals()
+        return self.intervals.free_until(spot_id, int(time.time()) if moment is None else moment)
+    
+    def get_free_spots(self, start, end, limit=20):
+        # Места, свободные на всем окне [start, end), новые первыми.
+        # Список мест читается по idx_spots_available_created, каждое
+        # проверяется по индексу броней, пока не наберется limit
+        self.sync_intervals()
+        spots = self._records(SpotItem, f'''
+            SELECT {self.SPOT_ITEM}
+            FROM spots s
+            JOIN users u ON s.owner_id = u.id
+            WHERE s.is_available = 1
+            ORDER BY s.created_at DESC, s.id DESC
+        ''')
+        return islice((spot for spot in spots if self.intervals.is_free(spot.id, start, end)), limit)
+    
+    # ========== РЯДОМ ==========
+    def sync_grid(self):
+        # Догружает в сетку места с координатами, добавленные после прошлой
+        # синхронизации (так же, как sync_intervals). Возвращает размер сетки
+        version = self.versions["spots"]
+        if version == self._grid_version:
+            return len(self.grid)
+        last_id = self.connection.execute("SELECT COALESCE(MAX(id), 0) FROM spots").fetchone()[0]
+        rows = self.connection.execute('''
+            SELECT id, geo_cell, latitude, longitude FROM spots
+            WHERE geo_cell IS NOT NULL AND id > ? AND id <= ?
+        ''', (self.grid.last_id, last_id))
+        self.grid.extend(rows)
+        self.grid.last_id = last_id
+        self._grid_version = version
+        return len(self.grid)
+    
+    def get_nearby_spots(self, latitude, longitude, limit=10, radius=20_000):
+        # До limit ближайших мест, свободных прямо сейчас, не дальше radius
+        # метров, ближние первыми. Кандидаты - из сетки в памяти, из базы
+        # читаются только найденные места по первичному ключу
+        self.sync_grid()
+        self.sync_intervals()
+        now = int(time.time())
+        nearest = self.grid.nearest(
+            latitude, longitude, limit, radius,
+            accept=lambda spot_id: self.intervals.is_free(spot_id, now, now + 1),
+        )
+        if not nearest:
+            return []
+        distances = {spot_id: meters for meters, spot_id in nearest}
+        placeholders = ",".join("?" * len(distances))
+        cursor = self.connection.cursor()
+        cursor.row_factory = None
+        cursor.execute(f'''
+            SELECT s.id, s.spot_number, s.address, s.price_per_hour, u.full_name as owner_name
+            FROM spots s
+            JOIN users u ON s.owner_id = u.id
+            WHERE s.id IN ({placeholders}) AND s.is_available = 1
+        ''', list(distances))
+        return sorted((NearSpot(*row, distances[row[0]]) for row in cursor), key=lambda spot: spot.distance)
+    
+    def get_user_bookings(self, user_id, limit=None):
+        # Вместе с архивом: подключаются только месяцы, где есть брони
+        # пользователя
+        return self._read_history(UserBooking, '''
+            SELECT b.id, s.spot_number, s.address, b.hours, b.total_price, b.created_at,
+                   u.full_name as spot_owner
+            FROM {bookings} b
+            JOIN spots s ON b.spot_id = s.id
+            JOIN users u ON s.owner_id = u.id
+            WHERE b.user_id = ?
+            ORDER BY b.created_at DESC
+            LIMIT ?
+        ''', (user_id, -1 if limit is None else limit), limit, user_id=user_id)
+    
+    def get_all_bookings(self, limit=None, connection=None):
+        # limit=None - все строки (LIMIT -1 в SQLite)
+        return self._read_history(AdminBooking, '''
+            SELECT b.id, s.spot_number, u1.full_name as client_name, u2.full_name as owner_name,
+                   b.hours, b.total_price, b.created_at
+            FROM {bookings} b
+            JOIN users u1 ON b.user_id = u1.id
+            JOIN spots s ON b.spot_id = s.id
+            JOIN users u2 ON s.owner_id = u2.id
+            ORDER BY b.created_at DESC
+            LIMIT ?
+        ''', (-1 if limit is None else limit,), limit, connection)
+    
+    # ========== АРХИВ БРОНИРОВАНИЙ ==========
+    # Завершенные брони старше порога лежат в файлах archive_dir по месяцам
+    # created_at ('ГГГГ-ММ'). Итоги по местам - в spot_earnings основной
+    # базы, поэтому суммы и счетчики архив не читают. Запросы истории
+    # подключают (ATTACH) нужные файлы по одному и склеивают результат.
+    BOOKING_COLUMNS = "id, user_id, spot_id, hours, total_price, status, created_at, starts_at, ends_at"
+    
+    ARCHIVE_SCHEMA = [
+        '''
+            CREATE TABLE IF NOT EXISTS archive.bookings (
+                id INTEGER PRIMARY KEY,
+                user_id INTEGER NOT NULL,
+                spot_id INTEGER NOT NULL,
+                hours INTEGER NOT NULL,
+                total_price INTEGER NOT NULL,
+                status TEXT,
+                created_at TIMESTAMP,
+                starts_at INTEGER,
+                ends_at INTEGER
+            )
+        ''',
+        "CREATE INDEX IF NOT EXISTS archive.idx_bookings_user_created ON bookings(user_id, created_at)",
+        "CREATE INDEX IF NOT EXISTS archive.idx_bookings_created ON bookings(created_at)",
+    ]
+    
+    def archive_path(self, month):
+        return os.path.join(self.archive_dir, f"bookings_{month.replace('-', '_')}.db")
+    
+    @contextmanager
+    def attached_archive(self, month, connection=None):
+        # ATTACH работает только вне транзакции, а одновременно SQLite
+        # держит не больше 10 подключенных баз - поэтому по одному файлу
+        connection = connection or self.connection
+        connection.execute("ATTACH DATABASE ? AS archive", (self.archive_path(month),))
+        try:
+            yield connection
+        finally:
+            connection.execute("DETACH DATABASE archive")
+    
+    def _archive_months(self, connection, user_id=None, since=None, until=None):
+        # Месяцы архива от новых к старым, при необходимости - только с
+        # бронями пользователя или попадающие в интервал дат
+        if user_id is not None:
+            rows = connection.execute('''
+                SELECT month FROM booking_archive_users
+                WHERE user_id = ? ORDER BY month DESC
+            ''', (user_id,))
+        else:
+            rows = connection.execute("SELECT month FROM booking_archives ORDER BY month DESC")
+        months = [row[0] for row in rows]
+        if since is not None:
+            months = [month for month in months if month >= since.strftime("%Y-%m")]
+        if until is not None:
+            months = [month for month in months if month <= until.strftime("%Y-%m")]
+        return months
+    
+    def _read_history(self, record, query, params, limit=None, connection=None, user_id=None):
+        # query читает из {bookings}: сначала горячая таблица, потом месяцы
+        # архива (только с бронями user_id, если он задан). Результат - как
+        # у одного запроса: created_at DESC, limit.
+        # Без архива - ленивый итератор, с архивом строки склеиваются в список
+        connection = connection or self.connection
+        rows = self._records(record, query.format(bookings="main.bookings"), params, connection)
+        # Месяцы - после горячей таблицы: если archive_month успел удалить
+        # из нее строки, их месяц уже есть в списке
+        months = self._archive_months(connection, user_id=user_id)
+        if not months:
+            return rows
+        rows = list(rows)
+        # Файлы архива читаются своими снимками, а граничный месяц
+        # переносится заново при каждом запуске: строка из снимка горячей
+        # таблицы может уже лежать и в архиве - склеиваем по id
+        seen = {row.id for row in rows}
+        for month in months:
+            # В архиве только брони старше всех горячих - если уже набрали
+            # limit строк, старые месяцы ничего не добавят
+            if limit is not None and len(rows) >= limit:
+                break
+            with self.attached_archive(month, connection):
+                for row in self._records(record, query.format(bookings="archive.bookings"), params, connection):
+                    if row.id not in seen:
+                        seen.add(row.id)
+                        rows.append(row)
+        rows.sort(key=lambda row: row.created_at, reverse=True)
+        return rows if limit is None else rows[:limit]
+    
+    def archive_cutoff(self, older_than_days=90):
+        # Граница переноса и месяцы, где есть завершенные брони старше нее.
+        # Дальше archive_month по одному месяцу за вызов: через AsyncDatabase
+        # между месяцами успевают пройти запросы хендлеров
+        if self.db_path == ":memory:":
+            return None, []
+        before = self.connection.execute(
+            "SELECT datetime('now', ?)", (f"-{older_than_days} days",)
+        ).fetchone()[0]
+        months = [row[0] for row in self.connection.execute('''
+            SELECT DISTINCT strftime('%Y-%m', created_at) FROM bookings
+            WHERE status = 'completed' AND created_at < ?
+        ''', (before,))]
+        return before, months
+    
+    def archive_bookings(self, older_than_days=90):
+        # Переносит завершенные брони старше older_than_days в архив за один
+        # вызов. Возвращает {месяц: перенесено броней}
+        before, months = self.archive_cutoff(older_than_days)
+        moved = {month: self.archive_month(month, before) for month in months}
+        if moved:
+            logger.info(f"Перенесено в архив броней: {moved}")
+        return moved
+    
+    def archive_month(self, month, before):
+        # Возвращает, сколько броней месяца перенесено
+        os.makedirs(self.archive_dir, exist_ok=True)
+        with self.attached_archive(month) as connection:
+            # 1. Копия в файл архива своей транзакцией. В режиме WAL
+            # транзакция над несколькими файлами не атомарна целиком,
+            # поэтому дальше удаляем из горячей таблицы только то, что уже
+            # лежит в архиве: повтор после сбоя ничего не теряет и не задваивает
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                for sql in self.ARCHIVE_SCHEMA:
+                    connection.execute(sql)
+                connection.execute(f'''
+                    INSERT OR IGNORE INTO archive.bookings ({self.BOOKING_COLUMNS})
+                    SELECT {self.BOOKING_COLUMNS} FROM main.bookings
+                    WHERE status = 'completed'
+                      AND created_at >= ? || '-01'
+                      AND created_at < MIN(date(? || '-01', '+1 month'), ?)
+                ''', (month, month, before))
+            except BaseException:
+                connection.rollback()
+                raise
+            connection.commit()
+            
+            # 2. Итоги и удаление - одной транзакцией основной базы
+            archived = "id IN (SELECT id FROM archive.bookings) AND status = 'completed'"
+            with self.transaction():
+                connection.execute(f'''
+                    INSERT INTO spot_earnings (spot_id, bookings_count, total_earnings)
+                    SELECT spot_id, COUNT(*), SUM(total_price) FROM main.bookings
+                    WHERE {archived}
+                    GROUP BY spot_id
+                    ON CONFLICT(spot_id) DO UPDATE SET
+                        bookings_count = bookings_count + excluded.bookings_count,
+                        total_earnings = total_earnings + excluded.total_earnings
+                ''')
+                connection.execute(f'''
+                    INSERT OR IGNORE INTO booking_archive_users (user_id, month)
+                    SELECT DISTINCT user_id, ? FROM main.bookings WHERE {archived}
+                ''', (month,))
+                connection.execute(f'''
+                    INSERT INTO booking_archives (month, bookings, earnings)
+                    SELECT ?, COUNT(*), COALESCE(SUM(total_price), 0) FROM main.bookings
+                    WHERE {archived}
+                    ON CONFLICT(month) DO UPDATE SET
+                        bookings = bookings + excluded.bookings,
+                        earnings = earnings + excluded.earnings,
+                        archived_at = CURRENT_TIMESTAMP
+                ''', (month,))
+                deleted = connection.execute(f"DELETE FROM main.bookings WHERE {archived}").rowcount
+                self.bump_version("bookings")
+        return deleted
+    
+    # ========== УВЕДОМЛЕНИЯ ==========
+    def enqueue_notification(self, chat_id, text):
+        cursor = self.connection.cursor()
+        cursor.execute('''
+            INSERT INTO outbox (chat_id, text, next_attempt_at)
+            VALUES (?, ?, ?)
+        ''', (chat_id, text, time.time()))
+        return cursor.lastrowid
+    
+    def get_due_notifications(self, limit=100):
+        # Не больше одного сообщения на чат: в чат можно писать раз в
+        # chat_interval, и очередь одного чата (рассылка, владелец с
+        # десятками броней) иначе заняла бы весь пакет. Для MIN() SQLite
+        # берет остальные столбцы из той же строки - самой ранней в чате
+        cursor = self.connection.cursor()
+        cursor.execute('''
+            SELECT id, chat_id, text, status, attempts, MIN(next_attempt_at) as next_attempt_at,
+                   last_error, created_at
+            FROM outbox
+            WHERE status = 'pending' AND next_attempt_at <= ?
+            GROUP BY chat_id
+            ORDER BY next_attempt_at
+            LIMIT ?
+        ''', (time.time(), limit))
+        return cursor.fetchall()
+    
+    def get_next_notification_time(self):
+        cursor = self.connection.cursor()
+        cursor.execute("SELECT MIN(next_attempt_at) FROM outbox WHERE status = 'pending'")
+        return cursor.fetchone()[0]
+    
+    def complete_notification(self, notification_id):
+        self.connection.execute("DELETE FROM outbox WHERE id = ?", (notification_id,))
+    
+    def retry_notification(self, notification_id, delay, error, max_attempts=5):
+        # После max_attempts неудач сообщение остается в таблице как failed
+        self.connection.execute('''
+            UPDATE outbox
+            SET attempts = attempts + 1,
+                next_attempt_at = ?,
+                last_error = ?,
+                status = CASE WHEN attempts + 1 >= ? THEN 'failed' ELSE 'pending' END
+            WHERE id = ?
+        ''', (time.time() + delay, error, max_attempts, notification_id))
+    
+    def defer_notification(self, notification_id, delay, error):
+        # Flood wait - лимит всего бота, а не ошибка сообщения: переносим
+        # без траты попытки, иначе после max_attempts пауз оно стало бы failed
+        self.connection.execute('''
+            UPDATE outbox SET next_attempt_at = ?, last_error = ?
+            WHERE id = ?
+        ''', (time.time() + delay, error, notification_id))
+    
+    def fail_notification(self, notification_id, error):
+        self.connection.execute('''
+            UPDATE outbox SET status = 'failed', attempts = attempts + 1, last_error = ?
+            WHERE id = ?
+        ''', (error, notification_id))
+    
+    # ========== АДМИН СТАТИСТИКА ==========
+    # connection - соединение читателя из пула AsyncDatabase (READ_POOL_METHODS)
+    def get_all_users(self, limit=None, connection=None):
+        return self._records(User, '''
+            SELECT id, telegram_id, username, full_name, is_admin, created_at
+            FROM users ORDER BY created_at DESC LIMIT ?
+        ''', (-1 if limit is None else limit,), connection)
+    
+    def get_all_spots_admin(self, limit=None, connection=None):
+        now = int(time.time())
+        return self._records(AdminSpot, f'''
+            SELECT s.id, s.spot_number, s.address, s.price_per_hour,
+                   u.full_name as owner_name, NOT {self.FREE_NOW} as is_busy,
+                   (SELECT COUNT(*) FROM bookings b
+                    WHERE b.spot_id = s.id)
+                       + COALESCE(e.bookings_count, 0) as bookings_count,
+                   COALESCE((SELECT SUM(b.total_price) FROM bookings b
+                             WHERE b.spot_id = s.id), 0)
+                       + COALESCE(e.total_earnings, 0) as total_earnings
+            FROM spots s
+            LEFT JOIN users u ON s.owner_id = u.id
+            LEFT JOIN spot_earnings e ON e.spot_id = s.id
+            ORDER BY s.created_at DESC
+            LIMIT ?
+        ''', (now, now, -1 if limit is None else limit), connection)
+    
+    # ========== ЭКСПОРТ ==========
+    # Выгрузки админки: (SELECT, столбец даты, условие по владельцу)
+    EXPORTS = {
+        "users": ('''
+            SELECT id, telegram_id, username, full_name, is_admin, created_at
+            FROM users u
+        ''', "u.created_at", None),
+        "spots": ('''
+            SELECT s.id, s.spot_number, s.address, s.price_per_hour, s.is_available,
+                   u.telegram_id as owner_telegram, u.full_name as owner_name,
+                   (SELECT COUNT(*) FROM bookings b
+                    WHERE b.spot_id = s.id)
+                       + COALESCE(e.bookings_count, 0) as bookings_count,
+                   (SELECT COALESCE(SUM(b.total_price), 0) FROM bookings b
+                    WHERE b.spot_id = s.id)
+                       + COALESCE(e.total_earnings, 0) as total_earnings,
+                   s.created_at
+            FROM spots s
+            LEFT JOIN users u ON s.owner_id = u.id
+            LEFT JOIN spot_earnings e ON e.spot_id = s.id
+        ''', "s.created_at", "s.owner_id = (SELECT id FROM users WHERE telegram_id = ?)"),
+        "bookings": ('''
+            SELECT b.id, s.spot_number, s.address,
+                   u1.telegram_id as client_telegram, u1.full_name as client_name,
+                   u2.telegram_id as owner_telegram, u2.full_name as owner_name,
+                   b.hours, b.total_price, b.status, b.starts_at, b.ends_at, b.created_at
+            FROM {bookings} b
+            JOIN users u1 ON b.user_id = u1.id
+            JOIN spots s ON b.spot_id = s.id
+            JOIN users u2 ON s.owner_id = u2.id
+        ''', "b.created_at", "u2.telegram_id = ?"),
+    }
+    
+    def open_reader(self):
+        # Отдельное соединение только для чтения: длинные выборки идут в
+        # своем потоке и не занимают воркер AsyncDatabase (WAL не блокирует
+        # писателя)
+        connection = sqlite3.connect(
+            f"file:{self.db_path}?mode=ro", uri=True, check_same_thread=False
+        )
+        connection.row_factory = sqlite3.Row
+        return connection
+    
+    def iter_export(self, kind, connection=None, since=None, until=None, owner_id=None, chunk_size=1000):
+        # Генератор строк выгрузки: первой идут названия столбцов, дальше
+        # данные пачками fetchmany - в памяти не больше chunk_size строк.
+        # since/until - даты (until включительно), owner_id - telegram_id.
+        # Брони выгружаются вместе с архивом
+        query, date_column, owner_condition = self.EXPORTS[kind]
+        conditions = []
+        params = []
+        if since is not None:
+            conditions.append(f"{date_column} >= ?")
+            params.append(since.isoformat())
+        if until is not None:
+            conditions.append(f"{date_column} < date(?, '+1 day')")
+            params.append(until.isoformat())
+        if owner_id is not None and owner_condition is not None:
+            conditions.append(owner_condition)
+            params.append(owner_id)
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += f" ORDER BY {date_column} DESC"
+        
+        connection = connection or self.connection
+        cursor = connection.execute(query.format(bookings="main.bookings"), params)
+        yield [column[0] for column in cursor.description]
+        if kind != "bookings":
+            yield from self._fetch_chunks(cursor, chunk_size)
+            return
+        
+        # Архивация во время выгрузки переносит строки, которые горячая
+        # таблица уже отдала из своего снимка. В архив попадают только
+        # завершенные брони - их id и запоминаем, чтобы не выгрузить дважды
+        # (горячая таблица держит лишь последние месяцы)
+        exported = set()
+        for row in self._fetch_chunks(cursor, chunk_size):
+            if row["status"] == "completed":
+                exported.add(row["id"])
+            yield row
+        for month in self._archive_months(connection, since=since, until=until):
+            with self.attached_archive(month, connection):
+                cursor = connection.execute(query.format(bookings="archive.bookings"), params)
+                for row in self._fetch_chunks(cursor, chunk_size):
+                    if row["id"] not in exported:
+                        yield row
+    
+    def _fetch_chunks(self, cursor, chunk_size):
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield from rows
+    
+    def get_stats(self):
+        cursor = self.connection.cursor()
+        cursor.execute("SELECT * FROM stats WHERE id = 1")
+        return cursor.fetchone()
+    
+    def rebuild_stats(self):
+        # Проверка согласованности: пересчитываем счетчики по базовым
+        # таблицам и возвращаем расхождения {поле: (было, стало)}
+        with self.transaction() as connection:
+            stored = connection.execute("SELECT * FROM stats WHERE id = 1").fetchone()
+            actual = connection.execute('''
+                SELECT (SELECT COUNT(*) FROM users) as users,
+                       (SELECT COUNT(*) FROM users WHERE is_admin) as admins,
+                       (SELECT COUNT(*) FROM spots) as spots,
+                       (SELECT COUNT(*) FROM bookings)
+                           + (SELECT COALESCE(SUM(bookings_count), 0) FROM spot_earnings) as bookings,
+                       (SELECT COALESCE(SUM(total_price), 0) FROM bookings)
+                           + (SELECT COALESCE(SUM(total_earnings), 0) FROM spot_earnings) as earnings
+            ''').fetchone()
+            
+            diff = {}
+            for key in actual.keys():
+                before = stored[key] if stored else None
+                if before != actual[key]:
+                    diff[key] = (before, actual[key])
+            if diff:
+                logger.warning(f"Счетчики статистики расходились с данными: {diff}")
+                connection.execute('''
+                    INSERT OR REPLACE INTO stats (id, users, admins, spots, bookings, earnings)
+                    VALUES (1, ?, ?, ?, ?, ?)
+                ''', tuple(actual))
+        return diff
+
+
+class AsyncDatabase:
+    # Асинхронный фасад над Database: все запросы выполняются в отдельном
+    # потоке-воркере, event loop только ждет результат.
+    # Методы называются так же, как у Database: await adb.get_user(...)
+    
+    # Записи, которые воркер объединяет в одну транзакцию (group commit)
+    GROUP_COMMIT_METHODS = {
+        "register_user", "add_spot", "create_booking", "claim_spot",
+        "enqueue_notification",
+    }
+    
+    # Тяжелые чтения админки: идут в пул потоков со своими соединениями
+    # mode=ro. Снимок WAL не блокирует запись и не ждет ее, а сами отчеты
+    # не стоят в очереди воркера перед бронированиями
+    READ_POOL_METHODS = {"get_all_users", "get_all_spots_admin", "get_all_bookings"}
+    
+    def __init__(self, database, batch_window=0.002, max_batch=64, readers=None):
+        self.database = database
+        # Сколько ждать попутные записи и сколько максимум класть в пакет;
+        # max_batch=1 отключает group commit
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        # Потоков-читателей; 0 - все запросы через воркер
+        self.readers = Config.DB_READERS if readers is None else readers
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._pool = None
+        self._local = threading.local()
+        self._reader_connections = []
+    
+    def _ensure_worker(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._worker, name="db-worker", daemon=True
+                )
+                self._thread.start()
+    
+    def _worker(self):
+        item = self._queue.get()
+        while item is not None:
+            if not item[4] or self.max_batch <= 1:
+                self._run(item)
+                item = self._queue.get()
+                continue
+            
+            # Собираем записи, пришедшие в течение batch_window; первое
+            # чтение или сигнал остановки закрывает пакет
+            batch = [item]
+            item = MISSING
+            deadline = time.monotonic() + self.batch_window
+            while len(batch) < self.max_batch:
+                try:
+                    next_item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if next_item is None or not next_item[4]:
+                    item = next_item
+                    break
+                batch.append(next_item)
+            self._run_batch(batch)
+            
+            if item is MISSING:
+                item = self._queue.get()
+    
+    def _run(self, item):
+        future, method, args, kwargs, _ = item
+        # Задача могла быть отменена, пока ждала в очереди
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            result = self._timed(method, args, kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+        else:
+            future.set_result(result)
+    
+    def _timed(self, method, args, kwargs):
+        # Время запроса по имени метода Database + лог медленных запросов
+        name = getattr(method, "__name__", "call")
+        started = time.perf_counter()
+        try:
+            result = method(*args, **kwargs)
+            # Ленивые списки Database дочитываются здесь: курсор не должен
+            # уходить из потока базы в event loop
+            if isinstance(result, Iterator):
+                result = list(result)
+            return result
+        except Exception:
+            metrics.query_errors.inc(name)
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            metrics.queries.observe(name, elapsed)
+            if elapsed * 1000 >= Config.SLOW_QUERY_MS:
+                logger.warning(f"Медленный запрос {name}{reprlib.repr(args)}: {elapsed * 1000:.1f} мс")
+    
+    def _run_batch(self, batch):
+        if len(batch) == 1:
+            self._run(batch[0])
+            return
+        
+        # Одна транзакция на пакет, каждая операция - в своем SAVEPOINT:
+        # ошибка одной записи не откатывает остальные
+        database = self.database
+        results = []
+        try:
+            database.connection.execute("BEGIN IMMEDIATE")
+            for future, method, args, kwargs, _ in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    with database.transaction():
+                        results.append((future, self._timed(method, args, kwargs), None))
+                except Exception as e:
+                    results.append((future, None, e))
+            started = time.perf_counter()
+            database.connection.commit()
+            metrics.queries.observe("commit", time.perf_counter() - started)
+            database.flush_versions()
+        except BaseException as e:
+            if database.connection.in_transaction:
+                database.connection.rollback()
+            database.flush_versions(committed=False)
+            # Кэш мог успеть запомнить строки из откаченной транзакции
+            database.user_cache.clear()
+            for future, *_ in batch:
+                if future.cancelled() or future.done():
+                    continue
+                if future.running() or future.set_running_or_notify_cancel():
+                    future.set_exception(e)
+            return
+        
+        # Результаты отдаем только после COMMIT
+        for future, result, error in results:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+    
+    def _ensure_pool(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(self.readers, thread_name_prefix="db-reader")
+            return self._pool
+    
+    def _read(self, method, args, kwargs):
+        # У каждого потока пула свое соединение, открывается при первом чтении
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._local.connection = self.database.open_reader()
+            with self._lock:
+                self._reader_connections.append(connection)
+        return self._timed(method, args, dict(kwargs, connection=connection))
+    
+    async def read(self, method, *args, **kwargs):
+        # Файл базы и схему создает основное соединение: mode=ro этого не умеет
+        if self.database._connection is None:
+            await self.call(lambda: self.database.connection)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._ensure_pool(), self._read, method, args, kwargs)
+    
+    async def get_user(self, telegram_id):
+        # Через UserMiddleware идет каждый апдейт: попадание в кэш отдаем
+        # сразу в event loop, а не в очереди воркера за импортом или архивом
+        user = self.database.cached_user(telegram_id)
+        if user is not MISSING:
+            return user
+        return await self.call(self.database.get_user, telegram_id)
+    
+    async def call(self, method, *args, **kwargs):
+        self._ensure_worker()
+        future = Future()
+        batchable = getattr(method, "__name__", None) in self.GROUP_COMMIT_METHODS
+        self._queue.put((future, method, args, kwargs, batchable))
+        return await asyncio.wrap_future(future)
+    
+    def __getattr__(self, name):
+        method = getattr(self.database, name)
+        if not callable(method):
+            return method
+        
+        if name in self.READ_POOL_METHODS and self.readers > 0:
+            async def wrapper(*args, **kwargs):
+                return await self.read(method, *args, **kwargs)
+        else:
+            async def wrapper(*args, **kwargs):
+                return await self.call(method, *args, **kwargs)
+        
+        wrapper.__name__ = name
+        setattr(self, name, wrapper)
+        return wrapper
+    
+    def close(self):
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        self._thread = None
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        for connection in self._reader_connections:
+            connection.close()
+        self._reader_connections = []
+        self._local = threading.local()
+
+db = Database()
+adb = AsyncDatabase(db)
\ No newline at end of file
@@ -0,0 +1,70 @@
+import csv
+import gzip
+import re
+from datetime import date
+
+# Выгрузка списков админки в CSV. Строки идут из курсора пачками прямо в
+# файл на диске, поэтому память не растет с размером таблицы.
+
+EXPORT_KINDS = ("users", "spots", "bookings")
+
+EXPORT_USAGE = (
+    "Используйте: /export users|spots|bookings [с ГГГГ-ММ-ДД] [по ГГГГ-ММ-ДД] "
+    "[owner=telegram_id] [gz]\n"
+    "Например: /export bookings 2024-01-01 2024-01-31 gz"
+)
+
+
+def parse_export_args(args):
+    # "/export bookings 2024-01-01 2024-01-31 owner=123 gz" ->
+    # (kind, {"since", "until", "owner_id"}, compress); None при ошибке
+    tokens = (args or "").split()
+    if not tokens or tokens[0] not in EXPORT_KINDS:
+        return None
+    kind = tokens[0]
+    filters = {}
+    compress = False
+    dates = []
+    for token in tokens[1:]:
+        if token == "gz":
+            compress = True
+        elif token.startswith("owner="):
+            if not token[6:].isdigit():
+                return None
+            filters["owner_id"] = int(token[6:])
+        elif re.fullmatch(r"\d{4}-\d{2}-\d{2}", token):
+            try:
+                dates.append(date.fromisoformat(token))
+            except ValueError:
+                return None
+        else:
+            return None
+    if len(dates) > 2:
+        return None
+    if dates:
+        filters["since"] = dates[0]
+    if len(dates) == 2:
+        filters["until"] = dates[1]
+    return kind, filters, compress
+
+
+def write_csv(rows, path, compress=False):
+    # Возвращает число строк данных (без заголовка)
+    opener = gzip.open if compress else open
+    written = -1
+    # utf-8-sig и ";" - чтобы файл сразу открывался в Excel
+    with opener(path, "wt", encoding="utf-8-sig", newline="") as f:
+        writer = csv.writer(f, delimiter=";")
+        for row in rows:
+            writer.writerow(row)
+            written += 1
+    return max(written, 0)
+
+
+def export_to_file(database, kind, path, compress=False, **filters):
+    # Синхронная: вызывается через asyncio.to_thread со своим соединением
+    connection = database.open_reader()
+    try:
+        return write_csv(database.iter_export(kind, connection, **filters), path, compress)
+    finally:
+        connection.close()
@@ -0,0 +1,202 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder
+
+from cache import MISSING, TTLCache
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class SQLiteStorage(BaseStorage):
+    # FSM-хранилище в таблице fsm_states той же базы (WAL).
+    # - чтение: локальный кэш, при промахе - запрос в базу;
+    # - запись: копится в pending и раз в flush_interval уходит в базу
+    #   одной транзакцией (executemany);
+    # - брошенные диалоги старше ttl удаляются раз в cleanup_interval.
+    # Когда несколько воркеров делят базу, после каждой записи растет общая
+    # версия "fsm", и остальные процессы сбрасывают свой кэш.
+    def __init__(self, database, flush_interval=0.01, ttl=24 * 3600,
+                 cleanup_interval=600, cache_size=10000):
+        self.database = database
+        self.flush_interval = flush_interval
+        self.ttl = ttl
+        self.cleanup_interval = cleanup_interval
+        self.key_builder = DefaultKeyBuilder(with_bot_id=True, with_destiny=True)
+        self._cache = TTLCache(maxsize=cache_size, ttl=300)
+        self._pending = {}
+        self._seen_version = None
+        self._connection = None
+        self._executor = None
+        self._flush_task = None
+        self._cleaned_at = time.monotonic()
+
+    # ========== СОЕДИНЕНИЕ ==========
+    # Соединение и поток открываются при первом обращении: в webhook-режиме
+    # это происходит уже в воркере после fork
+    def _connect(self):
+        connection = sqlite3.connect(
+            self.database.db_path, check_same_thread=False, isolation_level=None
+        )
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    async def _run(self, func, *args):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="fsm-storage")
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    def _fetch(self, key):
+        if self._connection is None:
+            self._connection = self._connect()
+        row = self._connection.execute(
+            "SELECT state, data FROM fsm_states WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None, {}
+        return row[0], json.loads(row[1])
+
+    def _write(self, records):
+        if self._connection is None:
+            self._connection = self._connect()
+        now = time.time()
+        upserts = []
+        deletes = []
+        for key, (state, data) in records.items():
+            if state is None and not data:
+                deletes.append((key,))
+            else:
+                upserts.append((key, state, json.dumps(data, ensure_ascii=False), now))
+
+        self._connection.execute("BEGIN IMMEDIATE")
+        try:
+            if upserts:
+                self._connection.executemany('''
+                    INSERT INTO fsm_states (key, state, data, updated_at)
+                    VALUES (?, ?, ?, ?)
+                    ON CONFLICT(key) DO UPDATE SET
+                        state = excluded.state,
+                        data = excluded.data,
+                        updated_at = excluded.updated_at
+                ''', upserts)
+            if deletes:
+                self._connection.executemany("DELETE FROM fsm_states WHERE key = ?", deletes)
+        except BaseException:
+            self._connection.rollback()
+            raise
+        self._connection.commit()
+
+    def _cleanup(self):
+        cursor = self._connection.execute(
+            "DELETE FROM fsm_states WHERE updated_at < ?", (time.time() - self.ttl,)
+        )
+        return cursor.rowcount
+
+    # ========== КЭШ ==========
+    def _check_version(self):
+        versions = self.database.versions
+        if not versions.shared:
+            return
+        version = versions["fsm"]
+        if version != self._seen_version:
+            # Кто-то другой записал состояния - локальному кэшу больше не верим
+            self._cache.clear()
+            self._seen_version = version
+
+    async def _get_record(self, key):
+        record = self._pending.get(key)
+        if record is not None:
+            return record
+        self._check_version()
+        record = self._cache.get(key)
+        if record is MISSING:
+            record = await self._run(self._fetch, key)
+            self._cache.set(key, record)
+        return record
+
+    def _put_record(self, key, record):
+        self._pending[key] = record
+        self._cache.set(key, record)
+        self._schedule_flush()
+
+    # ========== ЗАПИСЬ ==========
+    def _schedule_flush(self):
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        # Записи, пришедшие, пока шел flush, не запускают свою задачу (эта
+        # еще не завершена) - поэтому крутимся, пока _pending не опустеет
+        while self._pending:
+            await asyncio.sleep(self.flush_interval)
+            if not await self.flush():
+                # Повтор уже запланирован в flush
+                return
+
+    async def flush(self):
+        # False - запись не удалась, записи вернулись в _pending
+        if not self._pending:
+            return True
+        records, self._pending = self._pending, {}
+        try:
+            await self._run(self._write, records)
+        except Exception:
+            logger.exception("Не удалось сохранить состояния FSM, повторим")
+            # Не затираем более свежие записи, пришедшие во время сбоя
+            for key, record in records.items():
+                self._pending.setdefault(key, record)
+            asyncio.get_running_loop().call_later(1.0, self._schedule_flush)
+            return False
+
+        versions = self.database.versions
+        if versions.shared:
+            version = versions.increment("fsm")
+            # Между нашим чтением версии и записью никто не писал - кэш актуален
+            if self._seen_version is not None and version == self._seen_version + 1:
+                self._seen_version = version
+
+        if time.monotonic() - self._cleaned_at > self.cleanup_interval:
+            self._cleaned_at = time.monotonic()
+            removed = await self._run(self._cleanup)
+            if removed:
+                logger.info(f"Удалено брошенных диалогов: {removed}")
+        return True
+
+    # ========== BaseStorage ==========
+    async def set_state(self, key, state=None):
+        state = state.state if isinstance(state, State) else state
+        storage_key = self.key_builder.build(key)
+        _, data = await self._get_record(storage_key)
+        self._put_record(storage_key, (state, data))
+
+    async def get_state(self, key):
+        state, _ = await self._get_record(self.key_builder.build(key))
+        return state
+
+    async def set_data(self, key, data):
+        storage_key = self.key_builder.build(key)
+        state, _ = await self._get_record(storage_key)
+        self._put_record(storage_key, (state, data.copy()))
+
+    async def get_data(self, key):
+        _, data = await self._get_record(self.key_builder.build(key))
+        return data.copy()
+
+    async def close(self):
+        if self._flush_task is not None and not self._flush_task.done():
+            self._flush_task.cancel()
+        await self.flush()
+        if self._executor is not None:
+            if self._connection is not None:
+                await self._run(self._connection.close)
+                self._connection = None
+            self._executor.shutdown(wait=True)
+            self._executor = None
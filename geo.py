@@ -0,0 +1,85 @@
+import math
+from heapq import nsmallest
+
+EARTH_RADIUS = 6_371_000
+# Сторона ячейки сетки в градусах: ~1.1 км по широте
+CELL_DEGREES = 0.01
+COLUMNS = round(360 / CELL_DEGREES)
+
+
+def distance(lat1, lon1, lat2, lon2):
+    # Расстояние по поверхности Земли (haversine), метры
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS * math.asin(math.sqrt(a))
+
+
+def cell_of(lat, lon):
+    return math.floor((lat + 90) / CELL_DEGREES), math.floor((lon + 180) / CELL_DEGREES) % COLUMNS
+
+
+def cell_id(lat, lon):
+    # Номер ячейки одним числом - столбец spots.geo_cell
+    row, col = cell_of(lat, lon)
+    return row * COLUMNS + col
+
+
+def ring(row, col, radius):
+    # Номера ячеек на границе квадрата (2 * radius + 1) ячеек вокруг (row, col)
+    if radius == 0:
+        yield row * COLUMNS + col
+        return
+    for c in range(col - radius, col + radius + 1):
+        yield (row - radius) * COLUMNS + c % COLUMNS
+        yield (row + radius) * COLUMNS + c % COLUMNS
+    for r in range(row - radius + 1, row + radius):
+        yield r * COLUMNS + (col - radius) % COLUMNS
+        yield r * COLUMNS + (col + radius) % COLUMNS
+
+
+class GridIndex:
+    # Места с координатами, разложенные по ячейкам сетки. Ближайшие ищутся
+    # кольцами ячеек вокруг точки: расстояние считается только для мест из
+    # просмотренных ячеек, а не для всех мест
+    def __init__(self):
+        self._cells = {}
+        self._size = 0
+        # id последнего просмотренного места: id только растут (AUTOINCREMENT)
+        self.last_id = 0
+
+    def extend(self, items):
+        # Пакетная загрузка (spot_id, cell, lat, lon): номер ячейки уже
+        # посчитан при добавлении места (spots.geo_cell)
+        for spot_id, cell, lat, lon in items:
+            self._cells.setdefault(cell, []).append((spot_id, lat, lon))
+            self._size += 1
+
+    def nearest(self, lat, lon, limit, radius, accept=None):
+        # До limit мест не дальше radius метров: [(расстояние, spot_id)],
+        # ближние первыми. accept(spot_id) отсеивает неподходящие места
+        row, col = cell_of(lat, lon)
+        # Ячейка уже всего на самой близкой к полюсу широте в пределах
+        # radius: по ней оценивается, насколько далеко следующее кольцо
+        height = math.radians(CELL_DEGREES) * EARTH_RADIUS
+        reach = abs(lat) + math.degrees(radius / EARTH_RADIUS) + CELL_DEGREES
+        step = height * math.cos(math.radians(min(reach, 89.9)))
+        found = []
+        k = 0
+        while True:
+            for cell in ring(row, col, k):
+                for spot_id, spot_lat, spot_lon in self._cells.get(cell, ()):
+                    meters = distance(lat, lon, spot_lat, spot_lon)
+                    if meters <= radius and (accept is None or accept(spot_id)):
+                        found.append((meters, spot_id))
+            # Точка лежит в центральной ячейке, поэтому места из колец
+            # дальше k не ближе k * step
+            bound = k * step
+            if bound > radius:
+                break
+            if len(found) >= limit and nsmallest(limit, found)[-1][0] <= bound:
+                break
+            k += 1
+        return nsmallest(limit, found)
+
+    def __len__(self):
+        return self._size
@@ -0,0 +1,135 @@
+import asyncio
+import csv
+import io
+
+# Массовая загрузка мест из CSV. Файл читается построчно, валидные строки
+# копятся пачками по chunk_size и уходят в базу одним executemany на
+# транзакцию - в памяти не бывает больше одной пачки.
+
+MAX_NUMBER_LENGTH = 50
+MAX_ADDRESS_LENGTH = 200
+
+# Допустимые названия столбцов, если в первой строке есть заголовок
+COLUMNS = {
+    "spot_number": {"номер", "номер места", "место", "number", "spot", "spot_number"},
+    "address": {"адрес", "address"},
+    "price_per_hour": {"цена", "цена за час", "price", "price_per_hour"},
+}
+
+
+class ImportFailed(Exception):
+    # Файл перестал читаться посередине (кодировка, битый CSV): imported
+    # мест из предыдущих пачек уже сохранено
+    def __init__(self, imported, cause):
+        super().__init__(str(cause))
+        self.imported = imported
+        self.cause = cause
+
+
+def detect_encoding(path, sample_size=64 * 1024):
+    # Excel в русской локали сохраняет CSV в cp1251, остальные - в UTF-8
+    with open(path, "rb") as f:
+        sample = f.read(sample_size)
+    try:
+        sample.decode("utf-8")
+    except UnicodeDecodeError as e:
+        # Последний символ мог обрезаться на границе выборки
+        if e.start < len(sample) - 3:
+            return "cp1251"
+    return "utf-8-sig"
+
+
+def detect_dialect(f, sample_size=16 * 1024):
+    sample = f.read(sample_size)
+    f.seek(0)
+    try:
+        return csv.Sniffer().sniff(sample, delimiters=",;\t")
+    except csv.Error:
+        return csv.excel
+
+
+def read_header(row):
+    names = [cell.strip().lower() for cell in row]
+    positions = {}
+    for column, aliases in COLUMNS.items():
+        for i, name in enumerate(names):
+            if name in aliases:
+                positions[column] = i
+                break
+    if len(positions) == len(COLUMNS):
+        return positions["spot_number"], positions["address"], positions["price_per_hour"]
+    return None
+
+
+def parse_row(row, positions):
+    if len(row) <= max(positions):
+        return None, "не хватает столбцов (нужны номер, адрес, цена)"
+    spot_number, address, price = (row[i].strip() for i in positions)
+
+    if not spot_number:
+        return None, "пустой номер места"
+    if len(spot_number) > MAX_NUMBER_LENGTH:
+        return None, f"номер длиннее {MAX_NUMBER_LENGTH} символов"
+    if not address:
+        return None, "пустой адрес"
+    if len(address) > MAX_ADDRESS_LENGTH:
+        return None, f"адрес длиннее {MAX_ADDRESS_LENGTH} символов"
+    try:
+        price = int(price)
+    except ValueError:
+        return None, f"цена не число: {price!r}"
+    if price <= 0:
+        return None, "цена должна быть больше 0"
+    return (spot_number, address, price), None
+
+
+def parse_spots(path):
+    # Генератор (номер строки, (номер, адрес, цена) или None, ошибка или None)
+    with open(path, encoding=detect_encoding(path), newline="") as f:
+        reader = csv.reader(f, detect_dialect(f))
+        positions = (0, 1, 2)
+        for row in reader:
+            if not any(cell.strip() for cell in row):
+                continue
+            if reader.line_num == 1:
+                header = read_header(row)
+                if header is not None:
+                    positions = header
+                    continue
+            spot, error = parse_row(row, positions)
+            yield reader.line_num, spot, error
+
+
+async def import_spots(database, owner_id, path, chunk_size=500):
+    # database - AsyncDatabase. Возвращает (сколько добавлено, [(строка, ошибка)]).
+    # Если файл не дочитан, бросает ImportFailed с числом уже добавленных
+    imported = 0
+    errors = []
+    chunk = []
+    try:
+        for i, (line, spot, error) in enumerate(parse_spots(path), 1):
+            if error is not None:
+                errors.append((line, error))
+            else:
+                chunk.append(spot)
+            if len(chunk) >= chunk_size:
+                imported += await database.add_spots(owner_id, chunk)
+                chunk = []
+            elif i % chunk_size == 0:
+                # Файл из одних ошибок не должен надолго занимать event loop
+                await asyncio.sleep(0)
+    except (UnicodeDecodeError, csv.Error, ValueError) as e:
+        # csv.Error - не ValueError: например, поле длиннее field_size_limit
+        raise ImportFailed(imported, e) from e
+    if chunk:
+        imported += await database.add_spots(owner_id, chunk)
+    return imported, errors
+
+
+def errors_report(errors):
+    output = io.StringIO()
+    writer = csv.writer(output, delimiter=";")
+    writer.writerow(["строка", "ошибка"])
+    writer.writerows(errors)
+    # BOM, чтобы Excel открыл UTF-8 без кракозябр
+    return ("\ufeff" + output.getvalue()).encode("utf-8")
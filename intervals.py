@@ -0,0 +1,65 @@
+import math
+from bisect import bisect_left, bisect_right, insort
+
+
+class IntervalIndex:
+    # Активные брони в памяти как полуинтервалы [start, end): у каждого
+    # места свой отсортированный список, плюс общий список по началу -
+    # по нему выбрасываются закончившиеся. Брони одного места не
+    # пересекаются (это проверяет claim_spot), поэтому проверка окна -
+    # один бинарный поиск
+    def __init__(self):
+        self._spots = {}
+        self._starts = []
+        # Самая длинная бронь: начавшиеся раньше moment - max_length брони
+        # точно закончились к moment
+        self._max_length = 0
+        # id последней просмотренной брони: id только растут (AUTOINCREMENT)
+        self.last_id = 0
+
+    def extend(self, items):
+        # Пакетная загрузка (spot_id, start, end): при старте это все
+        # активные брони, дальше - новые с прошлой синхронизации
+        added = sorted((start, end, spot_id) for spot_id, start, end in items)
+        if not added:
+            return
+        for start, end, spot_id in added:
+            intervals = self._spots.setdefault(spot_id, [])
+            if intervals and intervals[-1][0] > start:
+                insort(intervals, (start, end))
+            else:
+                intervals.append((start, end))
+        self._starts.extend(added)
+        self._starts.sort()
+        self._max_length = max(self._max_length, max(end - start for start, end, _ in added))
+
+    def is_free(self, spot_id, start, end):
+        # Последняя бронь, начавшаяся до конца окна, не должна в него заходить
+        intervals = self._spots.get(spot_id)
+        if not intervals:
+            return True
+        i = bisect_left(intervals, (end,))
+        return i == 0 or intervals[i - 1][1] <= start
+
+    def free_until(self, spot_id, moment):
+        # До какого момента место свободно, начиная с moment: moment - если
+        # занято прямо сейчас, inf - если дальше броней нет
+        intervals = self._spots.get(spot_id, [])
+        i = bisect_right(intervals, (moment, math.inf))
+        if i > 0 and intervals[i - 1][1] > moment:
+            return moment
+        return intervals[i][0] if i < len(intervals) else math.inf
+
+    def prune(self, moment):
+        # Убирает брони, которые точно закончились к moment. Остальные
+        # закончившиеся поиску окон в будущем не мешают
+        k = bisect_right(self._starts, (moment - self._max_length, math.inf))
+        for start, end, spot_id in self._starts[:k]:
+            intervals = self._spots[spot_id]
+            intervals.remove((start, end))
+            if not intervals:
+                del self._spots[spot_id]
+        del self._starts[:k]
+
+    def __len__(self):
+        return len(self._starts)
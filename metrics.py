@@ -0,0 +1,127 @@
+import logging
+import threading
+from bisect import bisect_left
+
+from aiohttp import web
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограмм, секунды
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class Histogram:
+    # Гистограмма с одной меткой (имя хендлера, запроса, метода API).
+    # observe() вызывается и из event loop, и из потока базы - под локом
+    def __init__(self, name, description, label, buckets=BUCKETS):
+        self.name = name
+        self.description = description
+        self.label = label
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, seconds):
+        with self._lock:
+            series = self._series.get(value)
+            if series is None:
+                # Счетчики по корзинам (+Inf последней), сумма и количество
+                series = self._series[value] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][bisect_left(self.buckets, seconds)] += 1
+            series[1] += seconds
+            series[2] += 1
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {self.description}",
+            f"# TYPE {self.name} histogram",
+        ]
+        with self._lock:
+            series = sorted((value, [list(counts), total, n]) for value, (counts, total, n) in self._series.items())
+        for value, (counts, total, n) in series:
+            label = f'{self.label}="{escape(value)}"'
+            cumulative = 0
+            for bound, bucket in zip(self.buckets, counts):
+                cumulative += bucket
+                lines.append(f'{self.name}_bucket{{{label},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{label},le="+Inf"}} {n}')
+            lines.append(f"{self.name}_sum{{{label}}} {total}")
+            lines.append(f"{self.name}_count{{{label}}} {n}")
+        return "\n".join(lines)
+
+
+class Counter:
+    def __init__(self, name, description, label):
+        self.name = name
+        self.description = description
+        self.label = label
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, value, amount=1):
+        with self._lock:
+            self._values[value] = self._values.get(value, 0) + amount
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {self.description}",
+            f"# TYPE {self.name} counter",
+        ]
+        with self._lock:
+            values = sorted(self._values.items())
+        for value, total in values:
+            lines.append(f'{self.name}{{{self.label}="{escape(value)}"}} {total}')
+        return "\n".join(lines)
+
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Metrics:
+    # Все метрики процесса. В webhook-режиме у каждого воркера свои
+    def __init__(self):
+        self.handlers = Histogram("bot_handler_seconds", "Время обработки апдейта хендлером", "handler")
+        self.handler_errors = Counter("bot_handler_errors_total", "Исключения в хендлерах", "handler")
+        self.queries = Histogram("bot_db_query_seconds", "Время запроса к базе", "query")
+        self.query_errors = Counter("bot_db_query_errors_total", "Ошибки запросов к базе", "query")
+        self.api = Histogram("bot_api_request_seconds", "Время запроса к Bot API", "method")
+        self.api_errors = Counter("bot_api_request_errors_total", "Ошибки запросов к Bot API", "method")
+        self.throttled = Counter("bot_throttled_total", "Отсеянные апдейты по классу хендлера", "throttle")
+
+    def render(self):
+        return "\n".join(metric.render() for metric in (
+            self.handlers, self.handler_errors,
+            self.queries, self.query_errors,
+            self.api, self.api_errors,
+            self.throttled,
+        )) + "\n"
+
+
+metrics = Metrics()
+
+
+class MetricsServer:
+    # Отдает метрики в текстовом формате Prometheus: GET /metrics
+    def __init__(self, metrics):
+        self.metrics = metrics
+        self._runner = None
+
+    async def _handle(self, request):
+        return web.Response(text=self.metrics.render(), content_type="text/plain", charset="utf-8")
+
+    async def start(self, host, port):
+        if self._runner is not None:
+            return
+        app = web.Application()
+        app.router.add_get("/metrics", self._handle)
+        self._runner = web.AppRunner(app, access_log=None, handle_signals=False)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        logger.info(f"Метрики: http://{host}:{port}/metrics")
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
@@ -0,0 +1,122 @@
+import time
+
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.dispatcher.flags import get_flag
+from aiogram.types import CallbackQuery, InlineQuery
+
+from cache import MISSING, TTLCache
+from notifier import TokenBucket
+
+
+class UserMiddleware(BaseMiddleware):
+    # Загружает пользователя один раз на апдейт и передает его в хендлер
+    # аргументом user (None, если пользователь еще не зарегистрирован)
+    def __init__(self, database):
+        self.database = database
+    
+    async def __call__(self, handler, event, data):
+        from_user = data.get("event_from_user")
+        data["user"] = await self.database.get_user(from_user.id) if from_user else None
+        return await handler(event, data)
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    # Время хендлера по имени функции. Вешается внутренним middleware
+    # раньше UserMiddleware, чтобы в замер попала и загрузка пользователя
+    def __init__(self, metrics):
+        self.metrics = metrics
+    
+    async def __call__(self, handler, event, data):
+        name = data["handler"].callback.__name__
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            self.metrics.handler_errors.inc(name)
+            raise
+        finally:
+            self.metrics.handlers.observe(name, time.perf_counter() - started)
+
+
+class ApiMetricsMiddleware(BaseRequestMiddleware):
+    # Время исходящих запросов к Bot API по имени метода
+    def __init__(self, metrics):
+        self.metrics = metrics
+    
+    async def __call__(self, make_request, bot, method):
+        name = type(method).__name__
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception:
+            self.metrics.api_errors.inc(name)
+            raise
+        finally:
+            self.metrics.api.observe(name, time.perf_counter() - started)
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    # Token bucket на пару (пользователь, класс хендлера). Класс задается
+    # флагом хендлера: @router.message(..., flags={"throttle": "listing"}),
+    # без флага - "default". limits: класс -> (токенов в секунду, емкость).
+    # Вешается первым внутренним middleware: отсеянный апдейт не доходит
+    # даже до загрузки пользователя.
+    # Одинаковые callback'и, пришедшие пока первый еще обрабатывается,
+    # схлопываются: отвечаем на них пустым answer() и не выполняем.
+    def __init__(self, limits, metrics=None, maxsize=10000, warn_interval=10):
+        self.limits = limits
+        self.metrics = metrics
+        # Таблица ведер ограничена по размеру; ведро, простоявшее ttl,
+        # все равно было бы полным
+        self._buckets = TTLCache(maxsize=maxsize, ttl=60)
+        # Кого уже предупредили текстом, чтобы не отвечать на каждый спам
+        self._warned = TTLCache(maxsize=maxsize, ttl=warn_interval)
+        self._in_flight = set()
+    
+    def _acquire(self, user_id, name):
+        key = (user_id, name)
+        bucket = self._buckets.get(key)
+        if bucket is MISSING:
+            bucket = TokenBucket(*self.limits[name])
+        # set() заново продлевает ttl активного ведра
+        self._buckets.set(key, bucket)
+        return not bucket.try_acquire()
+    
+    async def __call__(self, handler, event, data):
+        from_user = data.get("event_from_user")
+        if from_user is None:
+            return await handler(event, data)
+        
+        coalesce_key = None
+        if isinstance(event, CallbackQuery):
+            message_id = event.message.message_id if event.message else event.inline_message_id
+            coalesce_key = (from_user.id, message_id, event.data)
+            if coalesce_key in self._in_flight:
+                if self.metrics is not None:
+                    self.metrics.throttled.inc("coalesced")
+                await event.answer()
+                return None
+        
+        name = get_flag(data, "throttle", default="default")
+        if not self._acquire(from_user.id, name):
+            if self.metrics is not None:
+                self.metrics.throttled.inc(name)
+            if isinstance(event, CallbackQuery):
+                await event.answer("⏳ Слишком часто, подождите немного")
+            elif isinstance(event, InlineQuery):
+                # Текст сюда не отправить; пустой ответ без кэша, чтобы
+                # клиент не ждал, а следующий запрос пришел к нам снова
+                await event.answer([], cache_time=0, is_personal=True)
+            elif self._warned.get(from_user.id) is MISSING:
+                self._warned.set(from_user.id, True)
+                await event.answer("⏳ Слишком много запросов, подождите немного")
+            return None
+        
+        if coalesce_key is None:
+            return await handler(event, data)
+        self._in_flight.add(coalesce_key)
+        try:
+            return await handler(event, data)
+        finally:
+            self._in_flight.discard(coalesce_key)
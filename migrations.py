@@ -0,0 +1,303 @@
+import logging
+import sqlite3
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# ========== МИГРАЦИИ ==========
+# (версия, описание, список SQL). Применяются строго по порядку, каждая
+# в своей транзакции; номер примененной версии пишется в schema_version.
+# Уже выпущенные миграции не меняем - только добавляем новые в конец.
+MIGRATIONS = [
+    (1, "Базовые таблицы", [
+        '''
+            CREATE TABLE IF NOT EXISTS users (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                telegram_id INTEGER UNIQUE NOT NULL,
+                username TEXT,
+                full_name TEXT NOT NULL,
+                phone TEXT,
+                car_plate TEXT,
+                is_admin BOOLEAN DEFAULT 0,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''',
+        '''
+            CREATE TABLE IF NOT EXISTS spots (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                owner_id INTEGER NOT NULL,
+                spot_number TEXT NOT NULL,
+                address TEXT NOT NULL,
+                price_per_hour INTEGER NOT NULL,
+                is_available BOOLEAN DEFAULT 1,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (owner_id) REFERENCES users(id)
+            )
+        ''',
+        '''
+            CREATE TABLE IF NOT EXISTS bookings (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                spot_id INTEGER NOT NULL,
+                hours INTEGER NOT NULL,
+                total_price INTEGER NOT NULL,
+                status TEXT DEFAULT 'active',
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (user_id) REFERENCES users(id),
+                FOREIGN KEY (spot_id) REFERENCES spots(id)
+            )
+        ''',
+    ]),
+    (2, "Индексы для списков мест", [
+        # get_spots(available_only=True), get_spots_page
+        "CREATE INDEX IF NOT EXISTS idx_spots_available_created ON spots(is_available, created_at, id)",
+        # get_spots(available_only=False), get_all_spots_admin
+        "CREATE INDEX IF NOT EXISTS idx_spots_created ON spots(created_at, id)",
+        # get_user_spots
+        "CREATE INDEX IF NOT EXISTS idx_spots_owner_created ON spots(owner_id, created_at)",
+    ]),
+    (3, "Индексы для бронирований и пользователей", [
+        # get_user_bookings
+        "CREATE INDEX IF NOT EXISTS idx_bookings_user_created ON bookings(user_id, created_at)",
+        # LEFT JOIN + SUM в get_all_spots_admin читает только индекс
+        "CREATE INDEX IF NOT EXISTS idx_bookings_spot_price ON bookings(spot_id, total_price)",
+        # get_all_bookings
+        "CREATE INDEX IF NOT EXISTS idx_bookings_created ON bookings(created_at)",
+        # get_all_users
+        "CREATE INDEX IF NOT EXISTS idx_users_created ON users(created_at)",
+    ]),
+    (4, "Счетчики статистики на триггерах", [
+        # Одна строка со счетчиками: экран статистики читает ее одним
+        # точечным запросом, а не считает базовые таблицы
+        '''
+            CREATE TABLE IF NOT EXISTS stats (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                users INTEGER NOT NULL DEFAULT 0,
+                admins INTEGER NOT NULL DEFAULT 0,
+                spots INTEGER NOT NULL DEFAULT 0,
+                bookings INTEGER NOT NULL DEFAULT 0,
+                earnings INTEGER NOT NULL DEFAULT 0
+            )
+        ''',
+        '''
+            INSERT OR REPLACE INTO stats (id, users, admins, spots, bookings, earnings)
+            SELECT 1,
+                   (SELECT COUNT(*) FROM users),
+                   (SELECT COUNT(*) FROM users WHERE is_admin),
+                   (SELECT COUNT(*) FROM spots),
+                   (SELECT COUNT(*) FROM bookings),
+                   (SELECT COALESCE(SUM(total_price), 0) FROM bookings)
+        ''',
+        '''
+            CREATE TRIGGER IF NOT EXISTS stats_users_insert AFTER INSERT ON users
+            BEGIN
+                UPDATE stats SET users = users + 1,
+                                 admins = admins + (COALESCE(NEW.is_admin, 0) != 0)
+                WHERE id = 1;
+            END
+        ''',
+        '''
+            CREATE TRIGGER IF NOT EXISTS stats_users_delete AFTER DELETE ON users
+            BEGIN
+                UPDATE stats SET users = users - 1,
+                                 admins = admins - (COALESCE(OLD.is_admin, 0) != 0)
+                WHERE id = 1;
+            END
+        ''',
+        '''
+            CREATE TRIGGER IF NOT EXISTS stats_users_admin AFTER UPDATE OF is_admin ON users
+            BEGIN
+                UPDATE stats SET admins = admins
+                                 + (COALESCE(NEW.is_admin, 0) != 0)
+                                 - (COALESCE(OLD.is_admin, 0) != 0)
+                WHERE id = 1;
+            END
+        ''',
+        '''
+            CREATE TRIGGER IF NOT EXISTS stats_spots_insert AFTER INSERT ON spots
+            BEGIN
+                UPDATE stats SET spots = spots + 1 WHERE id = 1;
+            END
+        ''',
+        '''
+            CREATE TRIGGER IF NOT EXISTS stats_spots_delete AFTER DELETE ON spots
+            BEGIN
+                UPDATE stats SET spots = spots - 1 WHERE id = 1;
+            END
+        ''',
+        # Бронирования считаются за все время, поэтому триггера на DELETE нет
+        '''
+            CREATE TRIGGER IF NOT EXISTS stats_bookings_insert AFTER INSERT ON bookings
+            BEGIN
+                UPDATE stats SET bookings = bookings + 1,
+                                 earnings = earnings + NEW.total_price
+                WHERE id = 1;
+            END
+        ''',
+    ]),
+    (5, "Очередь исходящих уведомлений", [
+        # Хендлеры только ставят сообщение в очередь, отправляет фоновый
+        # Notifier; доставленные строки удаляются
+        '''
+            CREATE TABLE IF NOT EXISTS outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                chat_id INTEGER NOT NULL,
+                text TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL,
+                last_error TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_outbox_pending ON outbox(next_attempt_at) WHERE status = 'pending'",
+    ]),
+    (6, "Время начала и окончания брони", [
+        "ALTER TABLE bookings ADD COLUMN starts_at INTEGER",
+        "ALTER TABLE bookings ADD COLUMN ends_at INTEGER",
+        # Старые брони считаем начавшимися в момент создания
+        '''
+            UPDATE bookings
+            SET starts_at = CAST(strftime('%s', created_at) AS INTEGER),
+                ends_at = CAST(strftime('%s', created_at) AS INTEGER) + hours * 3600
+        ''',
+        # Планировщик истечения читает только активные брони
+        "CREATE INDEX IF NOT EXISTS idx_bookings_active_ends ON bookings(ends_at) WHERE status = 'active'",
+    ]),
+    (7, "Полнотекстовый поиск по адресу и номеру места", [
+        # external content: индекс хранит только токены, тексты берутся из spots
+        '''
+            CREATE VIRTUAL TABLE IF NOT EXISTS spots_fts USING fts5(
+                spot_number, address,
+                content='spots', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2',
+                prefix='2 3'
+            )
+        ''',
+        '''
+            CREATE TRIGGER IF NOT EXISTS spots_fts_insert AFTER INSERT ON spots
+            BEGIN
+                INSERT INTO spots_fts (rowid, spot_number, address)
+                VALUES (NEW.id, NEW.spot_number, NEW.address);
+            END
+        ''',
+        '''
+            CREATE TRIGGER IF NOT EXISTS spots_fts_delete AFTER DELETE ON spots
+            BEGIN
+                INSERT INTO spots_fts (spots_fts, rowid, spot_number, address)
+                VALUES ('delete', OLD.id, OLD.spot_number, OLD.address);
+            END
+        ''',
+        '''
+            CREATE TRIGGER IF NOT EXISTS spots_fts_update AFTER UPDATE OF spot_number, address ON spots
+            BEGIN
+                INSERT INTO spots_fts (spots_fts, rowid, spot_number, address)
+                VALUES ('delete', OLD.id, OLD.spot_number, OLD.address);
+                INSERT INTO spots_fts (rowid, spot_number, address)
+                VALUES (NEW.id, NEW.spot_number, NEW.address);
+            END
+        ''',
+        "INSERT INTO spots_fts (spots_fts) VALUES ('rebuild')",
+    ]),
+    (8, "Хранилище состояний FSM", [
+        # Состояния диалогов переживают перезапуск и общие для всех воркеров
+        '''
+            CREATE TABLE IF NOT EXISTS fsm_states (
+                key TEXT PRIMARY KEY,
+                state TEXT,
+                data TEXT NOT NULL DEFAULT '{}',
+                updated_at REAL NOT NULL
+            )
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_fsm_states_updated ON fsm_states(updated_at)",
+    ]),
+    (9, "Архив завершенных бронирований и сводка заработка по местам", [
+        # Завершенные старые брони переезжают в помесячные файлы архива;
+        # здесь остаются только итоги, чтобы суммы не требовали архива
+        '''
+            CREATE TABLE IF NOT EXISTS spot_earnings (
+                spot_id INTEGER PRIMARY KEY,
+                bookings_count INTEGER NOT NULL DEFAULT 0,
+                total_earnings INTEGER NOT NULL DEFAULT 0
+            )
+        ''',
+        # Какие месяцы уже в архиве (месяц - 'ГГГГ-ММ' по created_at)
+        '''
+            CREATE TABLE IF NOT EXISTS booking_archives (
+                month TEXT PRIMARY KEY,
+                bookings INTEGER NOT NULL DEFAULT 0,
+                earnings INTEGER NOT NULL DEFAULT 0,
+                archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''',
+        # В каких месяцах архива есть брони пользователя: get_user_bookings
+        # подключает только эти файлы
+        '''
+            CREATE TABLE IF NOT EXISTS booking_archive_users (
+                user_id INTEGER NOT NULL,
+                month TEXT NOT NULL,
+                PRIMARY KEY (user_id, month)
+            ) WITHOUT ROWID
+        ''',
+    ]),
+    (10, "Брони как интервалы [начало, конец)", [
+        # claim_spot ищет пересечения среди активных броней места
+        '''
+            CREATE INDEX IF NOT EXISTS idx_bookings_active_spot
+            ON bookings(spot_id, starts_at, ends_at) WHERE status = 'active'
+        ''',
+        # is_available теперь значит "место выставлено", а занятость
+        # считается по броням: на одно место можно несколько броней
+        # в разное время
+        "UPDATE spots SET is_available = 1",
+    ]),
+    (11, "Координаты мест и ячейки сетки для поиска рядом", [
+        "ALTER TABLE spots ADD COLUMN latitude REAL",
+        "ALTER TABLE spots ADD COLUMN longitude REAL",
+        # Номер ячейки сетки (geo.cell_id), по нему места раскладываются в
+        # geo.GridIndex. Отдельный индекс не нужен: сетка живет в памяти и
+        # догружается из базы по id, как индекс броней
+        "ALTER TABLE spots ADD COLUMN geo_cell INTEGER",
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(connection):
+    connection.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    row = connection.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    return row[0] or 0
+
+
+def schema_is_current(connection):
+    # Быстрая проверка при старте: одно чтение, без DDL
+    try:
+        row = connection.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    except sqlite3.OperationalError:
+        return False
+    return row[0] == LATEST_VERSION
+
+
+def apply_migrations(connection):
+    current = get_schema_version(connection)
+    for version, description, statements in MIGRATIONS:
+        if version <= current:
+            continue
+        logger.info(f"Применяю миграцию {version}: {description}")
+        connection.execute("BEGIN")
+        try:
+            for sql in statements:
+                connection.execute(sql)
+            connection.execute("INSERT INTO schema_version (version) VALUES (?)", (version,))
+        except Exception:
+            connection.rollback()
+            raise
+        connection.commit()
+    return LATEST_VERSION
+
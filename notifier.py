@@ -0,0 +1,166 @@
+import asyncio
+import logging
+import time
+
+from aiogram.exceptions import (
+    TelegramBadRequest,
+    TelegramForbiddenError,
+    TelegramRetryAfter,
+)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    # Классический token bucket: rate токенов в секунду, не больше capacity
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def try_acquire(self):
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        # Сколько ждать до следующего токена
+        return (1 - self.tokens) / self.rate
+
+    async def acquire(self):
+        while True:
+            wait = self.try_acquire()
+            if not wait:
+                return
+            await asyncio.sleep(wait)
+
+
+class Notifier:
+    # Фоновая отправка сообщений из таблицы outbox.
+    # Лимиты Telegram: ~30 сообщений/с на бота и ~1 сообщение/с в один чат.
+    # RetryAfter - пауза всей отправки, сообщение переносится без траты
+    # попытки; сетевые ошибки - повтор с задержкой, после max_attempts
+    # сообщение помечается failed; 403/400 - сразу failed.
+    def __init__(self, bot, database, rate=30, chat_interval=1.0,
+                 max_attempts=5, batch_size=50, idle_timeout=5.0):
+        self.bot = bot
+        self.database = database
+        self.bucket = TokenBucket(rate)
+        self.chat_interval = chat_interval
+        self.max_attempts = max_attempts
+        self.batch_size = batch_size
+        self.idle_timeout = idle_timeout
+        # chat_id -> когда в этот чат снова можно писать (monotonic)
+        self._chat_ready_at = {}
+        self._paused_until = 0
+        self._event = asyncio.Event()
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def wake(self):
+        # Хендлер поставил сообщение в очередь - не ждем idle_timeout
+        self._event.set()
+
+    async def enqueue(self, chat_id, text):
+        notification_id = await self.database.enqueue_notification(chat_id, text)
+        self.wake()
+        return notification_id
+
+    async def _run(self):
+        while True:
+            try:
+                wait = await self._process_batch()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Ошибка в цикле отправки уведомлений")
+                wait = self.idle_timeout
+
+            if wait is None or wait > 0:
+                self._event.clear()
+                try:
+                    await asyncio.wait_for(self._event.wait(), timeout=wait or self.idle_timeout)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def _process_batch(self):
+        # Возвращает, сколько можно спать до следующей попытки
+        # (0 - есть еще работа, None - очередь пуста)
+        pause = self._paused_until - time.monotonic()
+        if pause > 0:
+            return pause
+
+        rows = await self.database.get_due_notifications(self.batch_size)
+        if not rows:
+            next_at = await self.database.get_next_notification_time()
+            return None if next_at is None else max(next_at - time.time(), 0.05)
+
+        self._prune_chats()
+        sent = 0
+        chat_wait = None
+        for row in rows:
+            # Чат упирается в свой лимит - оставляем сообщение в очереди
+            ready_in = self._chat_ready_at.get(row['chat_id'], 0) - time.monotonic()
+            if ready_in > 0:
+                chat_wait = ready_in if chat_wait is None else min(chat_wait, ready_in)
+                continue
+
+            await self.bucket.acquire()
+            if not await self._deliver(row):
+                # Flood wait на весь бот - прекращаем отправку до паузы
+                break
+            sent += 1
+
+        if sent == len(rows):
+            return 0
+        return chat_wait if chat_wait is not None else max(self._paused_until - time.monotonic(), 0)
+
+    async def _deliver(self, row):
+        self._chat_ready_at[row['chat_id']] = time.monotonic() + self.chat_interval
+        try:
+            await self.bot.send_message(chat_id=row['chat_id'], text=row['text'])
+        except TelegramRetryAfter as e:
+            logger.warning(f"Flood wait {e.retry_after} с при отправке в чат {row['chat_id']}")
+            self._paused_until = time.monotonic() + e.retry_after
+            await self.database.defer_notification(row['id'], e.retry_after, str(e))
+            return False
+        except (TelegramForbiddenError, TelegramBadRequest) as e:
+            # Бот заблокирован или чат не существует - повтор не поможет
+            logger.warning(f"Уведомление {row['id']} не доставлено: {e}")
+            await self.database.fail_notification(row['id'], str(e))
+        except Exception as e:
+            delay = min(2 ** row['attempts'], 300)
+            logger.warning(f"Уведомление {row['id']} отложено на {delay} с: {e}")
+            await self.database.retry_notification(row['id'], delay, str(e), self.max_attempts)
+        else:
+            await self.database.complete_notification(row['id'])
+        return True
+
+    def _prune_chats(self):
+        # Таблица лимитов по чатам не должна расти бесконечно
+        if len(self._chat_ready_at) < 10000:
+            return
+        now = time.monotonic()
+        self._chat_ready_at = {
+            chat_id: ready_at
+            for chat_id, ready_at in self._chat_ready_at.items()
+            if ready_at > now
+        }
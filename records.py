@@ -0,0 +1,45 @@
+from collections import namedtuple
+
+# Компактные записи вместо sqlite3.Row: namedtuple без __dict__
+# (__slots__ = ()), и в каждой только столбцы, которые нужны месту вызова.
+# Поля читаются как атрибуты (spot.id) и по имени (spot['id']), как у
+# sqlite3.Row - хендлерам разница не видна
+
+
+class RecordMixin:
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return getattr(self, key)
+        return tuple.__getitem__(self, key)
+
+    def keys(self):
+        return self._fields
+
+
+def record(name, fields):
+    return type(name, (RecordMixin, namedtuple(name, fields)), {"__slots__": ()})
+
+
+# Пользователь: middleware и кэш пользователей, список в админке
+User = record("User", "id telegram_id username full_name is_admin created_at")
+
+# Место в списках: страница, поиск, свободные окна. created_at - курсор страницы
+SpotItem = record("SpotItem", "id spot_number address price_per_hour owner_name created_at")
+# Карточка места и бронирование: нужен контакт владельца
+SpotCard = record("SpotCard", "id spot_number address price_per_hour owner_name owner_telegram")
+# "Мои места"
+OwnSpot = record("OwnSpot", "id spot_number address price_per_hour is_busy active_bookings")
+# Места в админке
+AdminSpot = record(
+    "AdminSpot",
+    "id spot_number address price_per_hour owner_name is_busy bookings_count total_earnings"
+)
+# "Рядом": distance - метры от точки пользователя, считается в geo
+NearSpot = record("NearSpot", "id spot_number address price_per_hour owner_name distance")
+
+# "Мои брони". created_at - склейка с архивом по дате
+UserBooking = record("UserBooking", "id spot_number address hours total_price created_at spot_owner")
+# Брони в админке
+AdminBooking = record("AdminBooking", "id spot_number client_name owner_name hours total_price created_at")
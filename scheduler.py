@@ -0,0 +1,117 @@
+import asyncio
+import heapq
+import logging
+import time
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class ExpiryScheduler:
+    # Завершение броней по истечении времени. Все активные брони лежат в
+    # одной min-куче (ends_at, booking_id), один таймер спит до ближайшей;
+    # никаких задач на каждую бронь и опросов таблицы.
+    def __init__(self, database, batch_size=500):
+        self.database = database
+        self.batch_size = batch_size
+        self._heap = []
+        self._event = asyncio.Event()
+        self._task = None
+
+    async def start(self):
+        if self._task is not None:
+            return
+        self._heap = await self.database.get_active_expiries()
+        heapq.heapify(self._heap)
+        logger.info(f"Загружено активных броней: {len(self._heap)}")
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def add(self, booking_id, ends_at):
+        heapq.heappush(self._heap, (ends_at, booking_id))
+        # Новая бронь истекает раньше всех - перезаводим таймер
+        if self._heap[0][1] == booking_id:
+            self._event.set()
+
+    def __len__(self):
+        return len(self._heap)
+
+    async def _run(self):
+        while True:
+            now = time.time()
+            due = []
+            while self._heap and self._heap[0][0] <= now and len(due) < self.batch_size:
+                due.append(heapq.heappop(self._heap)[1])
+
+            if due:
+                try:
+                    freed = await self.database.complete_bookings(due)
+                except asyncio.CancelledError:
+                    raise
+                except Exception:
+                    logger.exception("Не удалось завершить брони, повторим позже")
+                    for booking_id in due:
+                        heapq.heappush(self._heap, (now + 30, booking_id))
+                else:
+                    logger.info(f"Завершено броней: {len(due)}, освобождено мест: {len(freed)}")
+                continue
+
+            timeout = self._heap[0][0] - now if self._heap else None
+            self._event.clear()
+            try:
+                await asyncio.wait_for(self._event.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+
+class ArchiveScheduler:
+    # Раз в interval переносит завершенные брони старше older_than_days в
+    # помесячный архив. Первый прогон - сразу после старта
+    def __init__(self, database, older_than_days=90, interval=24 * 3600):
+        self.database = database
+        self.older_than_days = older_than_days
+        self.interval = interval
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def archive(self):
+        # Каждый месяц - отдельный вызов воркера базы, а не весь перенос
+        # одним: первый прогон по большому хвосту не держит очередь
+        # запросов хендлеров
+        before, months = await self.database.archive_cutoff(self.older_than_days)
+        moved = {}
+        for month in months:
+            moved[month] = await self.database.archive_month(month, before)
+        if moved:
+            logger.info(f"Перенесено в архив броней: {moved}")
+        return moved
+
+    async def _run(self):
+        while True:
+            try:
+                await self.archive()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Не удалось перенести брони в архив")
+            await asyncio.sleep(self.interval)
@@ -0,0 +1,106 @@
+import asyncio
+
+import pytest
+from aiogram.exceptions import TelegramForbiddenError, TelegramNetworkError, TelegramRetryAfter
+from aiogram.methods import SendMessage
+
+from database import AsyncDatabase, Database
+from notifier import Notifier
+
+MAX_ATTEMPTS = 5
+# Flood wait чаще, чем max_attempts: сообщение все равно должно уйти
+FLOOD_WAITS = MAX_ATTEMPTS + 2
+
+FLOODED, BLOCKED, NETWORK, OK = 1, 2, 3, 4
+
+
+class FakeBot:
+    # send_message без Telegram: каждый чат ведет себя по-своему
+    # (flood wait, блокировка, сетевая ошибка, успех)
+    def __init__(self):
+        self.sent = []
+        self.flood_waits = 0
+
+    async def send_message(self, chat_id, text):
+        method = SendMessage(chat_id=chat_id, text=text)
+        if chat_id == FLOODED and self.flood_waits < FLOOD_WAITS:
+            self.flood_waits += 1
+            raise TelegramRetryAfter(method, "Too Many Requests", retry_after=0)
+        if chat_id == BLOCKED:
+            raise TelegramForbiddenError(method, "bot was blocked by the user")
+        if chat_id == NETWORK:
+            raise TelegramNetworkError(method, "connection reset")
+        self.sent.append(chat_id)
+
+
+async def deliver_all(tmp_path):
+    database = Database(str(tmp_path / "outbox.db"))
+    adb = AsyncDatabase(database)
+    bot = FakeBot()
+    notifier = Notifier(bot, adb, chat_interval=0, max_attempts=MAX_ATTEMPTS)
+    for chat_id in (FLOODED, BLOCKED, NETWORK, OK):
+        await adb.enqueue_notification(chat_id, f"Сообщение в чат {chat_id}")
+    # Сетевая ошибка ждет 2^attempts секунд - начинаем с последней попытки
+    database.connection.execute("UPDATE outbox SET attempts = ? WHERE chat_id = ?", (MAX_ATTEMPTS - 1, NETWORK))
+
+    for _ in range(50):
+        await notifier._process_batch()
+        if await adb.get_next_notification_time() is None:
+            break
+
+    # Доставленные сообщения из outbox удаляются, остальные - (статус, попытки)
+    outbox = {
+        row['chat_id']: (row['status'], row['attempts'])
+        for row in database.connection.execute("SELECT chat_id, status, attempts FROM outbox")
+    }
+    adb.close()
+    database.close()
+    return bot, outbox
+
+
+@pytest.fixture(scope="module")
+def delivered(tmp_path_factory):
+    return asyncio.run(deliver_all(tmp_path_factory.mktemp("notifier")))
+
+
+def test_flood_wait_does_not_spend_attempts(delivered):
+    bot, outbox = delivered
+    assert bot.flood_waits == FLOOD_WAITS
+    assert FLOODED in bot.sent
+    assert FLOODED not in outbox
+
+
+def test_blocked_chat_fails_at_once(delivered):
+    _, outbox = delivered
+    assert outbox[BLOCKED] == ("failed", 1)
+
+
+def test_network_error_fails_after_max_attempts(delivered):
+    _, outbox = delivered
+    assert outbox[NETWORK] == ("failed", MAX_ATTEMPTS)
+
+
+def test_ok_is_delivered(delivered):
+    bot, outbox = delivered
+    assert OK in bot.sent
+    assert OK not in outbox
+
+
+async def first_batch(tmp_path, busy_chat, other_chat, batch_size=50):
+    database = Database(str(tmp_path / "outbox.db"))
+    adb = AsyncDatabase(database)
+    bot = FakeBot()
+    notifier = Notifier(bot, adb, chat_interval=60, batch_size=batch_size)
+    # Очередь одного чата длиннее пакета и стоит раньше всех
+    for i in range(batch_size + 10):
+        await adb.enqueue_notification(busy_chat, f"Сообщение {i}")
+    await adb.enqueue_notification(other_chat, "Сообщение в другой чат")
+    await notifier._process_batch()
+    adb.close()
+    database.close()
+    return bot
+
+
+def test_long_chat_queue_does_not_block_other_chats(tmp_path):
+    bot = asyncio.run(first_batch(tmp_path, 10, 11))
+    assert sorted(bot.sent) == [10, 11]
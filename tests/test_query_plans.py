@@ -0,0 +1,77 @@
+import pytest
+
+from database import Database
+
+# Вызовы Database, которые должны идти по индексам, а не сканировать таблицы
+HOT_CALLS = [
+    ("get_user", (1,)),
+    ("get_spots", (True,)),
+    ("get_spots", (False,)),
+    ("get_spots_page", ()),
+    ("get_spots_page", (("2024-01-01 00:00:00", 1),)),
+    ("get_spots_page", (("2024-01-01 00:00:00", 1), True)),
+    ("get_spot", (1,)),
+    ("get_user_spots", (1,)),
+    ("get_user_bookings", (1,)),
+    ("get_all_bookings", (20,)),
+    ("get_all_users", (20,)),
+    ("get_all_spots_admin", (20,)),
+    ("get_stats", ()),
+    ("get_active_expiries", ()),
+    ("sync_intervals", ()),
+    ("get_free_spots", (0, 3600)),
+    ("claim_spot", (2, 1, 1, 0)),
+    ("sync_grid", ()),
+    ("get_nearby_spots", (55.75, 37.62)),
+    ("search_spots", ("адрес 1", 20, 50, 500)),
+]
+
+
+def find_table_scans(database, calls=HOT_CALLS):
+    # Перехватываем реальные SQL-запросы методов и смотрим их план:
+    # "SCAN t" без "USING INDEX" означает полный проход по таблице;
+    # "SCAN ... VIRTUAL TABLE INDEX" - это поиск по индексу FTS5,
+    # "SCAN (subquery-N)" - проход по уже ограниченному подзапросу
+    statements = []
+    database.connection.set_trace_callback(statements.append)
+    try:
+        for name, args in calls:
+            getattr(database, name)(*args)
+    finally:
+        database.connection.set_trace_callback(None)
+
+    scans = []
+    for sql in statements:
+        if not sql.lstrip().upper().startswith("SELECT"):
+            continue
+        for row in database.connection.execute("EXPLAIN QUERY PLAN " + sql):
+            detail = row[3]
+            if detail.startswith("SCAN") and "USING" not in detail and "VIRTUAL TABLE INDEX" not in detail \
+                    and not detail.startswith("SCAN (subquery"):
+                scans.append((" ".join(sql.split()), detail))
+    return scans
+
+
+@pytest.fixture(scope="module")
+def database(tmp_path_factory):
+    database = Database(str(tmp_path_factory.mktemp("plans") / "check.db"))
+    # На пустых таблицах планировщик предпочитает скан - заполняем
+    # базу и собираем статистику для оптимизатора
+    for i in range(200):
+        database.register_user(1000 + i, f"User {i}")
+    for i in range(1000):
+        # Места сеткой ~100x10 на ~6x1 км вокруг точки из HOT_CALLS
+        database.add_spot(2 + i % 200, f"A{i}", f"Адрес {i}", 100,
+                          55.70 + i % 100 * 0.001, 37.60 + i // 100 * 0.001)
+    for i in range(2000):
+        database.create_booking(2 + i % 200, 1 + i % 1000, 2)
+    # Как в жизни: почти все брони уже завершены
+    database.complete_bookings(list(range(1, 1901)))
+    database.connection.execute("ANALYZE")
+    yield database
+    database.close()
+
+
+def test_hot_queries_use_indexes(database):
+    assert find_table_scans(database) == []
+
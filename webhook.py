@@ -0,0 +1,134 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import time
+
+from aiohttp import web
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler
+
+import database
+from config import Config
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+# ========== СОКЕТ ==========
+def create_socket(host, port):
+    # Сокет открывает мастер до fork, воркеры принимают соединения с него
+    # же - ядро раздает входящие соединения между процессами
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(1024)
+    sock.setblocking(False)
+    return sock
+
+
+# ========== ВОРКЕР ==========
+async def serve(index, sock, bot_app, start_services, stop_services):
+    dp, bot = bot_app.dp, bot_app.bot
+    app = web.Application()
+    # handle_in_background=False: запрос живет, пока апдейт обрабатывается,
+    # поэтому остановка сервера с shutdown_timeout дожидается всех хендлеров
+    SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        handle_in_background=False,
+        secret_token=Config.WEBHOOK_SECRET,
+    ).register(app, path=Config.WEBHOOK_PATH)
+
+    runner = web.AppRunner(app, handle_signals=False, shutdown_timeout=Config.WEBHOOK_DRAIN_TIMEOUT)
+    await runner.setup()
+    # Службы и прогрев - до того, как воркер начнет принимать соединения
+    await dp.emit_startup(bot=bot)
+    await start_services(bot_app, notifications=index == 0, worker=index)
+    site = web.SockSite(runner, sock)
+    await site.start()
+    logger.info(f"Воркер {index} (pid {os.getpid()}) принимает апдейты")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    loop.add_signal_handler(signal.SIGTERM, stop.set)
+    loop.add_signal_handler(signal.SIGINT, stop.set)
+    await stop.wait()
+
+    # Graceful drain: закрываем сокет, ждем текущие запросы, потом фоновые задачи
+    logger.info(f"Воркер {index} останавливается")
+    await runner.cleanup()
+    await dp.emit_shutdown(bot=bot)
+    await stop_services(bot_app)
+    await bot.session.close()
+
+
+def run_worker(index, sock, bot_app, start_services, stop_services):
+    # Соединение SQLite нельзя переносить через fork - открываем свое
+    database.db.connect()
+    asyncio.run(serve(index, sock, bot_app, start_services, stop_services))
+
+
+# ========== МАСТЕР ==========
+async def set_webhook(bot):
+    await bot.set_webhook(
+        url=Config.WEBHOOK_URL.rstrip("/") + Config.WEBHOOK_PATH,
+        secret_token=Config.WEBHOOK_SECRET,
+        drop_pending_updates=False,
+    )
+    await bot.session.close()
+
+
+def run_webhook(bot_app, start_services, stop_services, workers=None):
+    # Pre-fork: мастер слушает порт и держит N воркеров, каждый со своим
+    # event loop. Упавший воркер перезапускается, SIGTERM/SIGINT
+    # пересылается воркерам, которые дорабатывают текущие апдейты
+    workers = workers or Config.WEBHOOK_WORKERS
+    sock = create_socket(Config.WEBHOOK_HOST, Config.WEBHOOK_PORT)
+    asyncio.run(set_webhook(bot_app.bot))
+    # Миграции - один раз в мастере, до fork; воркеры откроют свои соединения
+    database.db.connect()
+    database.db.close()
+    # Версии данных для кэшей должны быть общими для всех воркеров
+    database.db.versions = database.SharedVersions()
+
+    context = multiprocessing.get_context("fork")
+
+    def spawn(index):
+        process = context.Process(
+            target=run_worker,
+            args=(index, sock, bot_app, start_services, stop_services),
+            name=f"bot-worker-{index}",
+        )
+        process.start()
+        return process
+
+    processes = {index: spawn(index) for index in range(workers)}
+    logger.info(f"Webhook на {Config.WEBHOOK_HOST}:{Config.WEBHOOK_PORT}, воркеров: {workers}")
+
+    stopping = False
+
+    def shutdown(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for process in processes.values():
+            if process.is_alive():
+                process.terminate()
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    while not stopping:
+        for index, process in list(processes.items()):
+            if not process.is_alive() and not stopping:
+                logger.warning(f"Воркер {index} завершился с кодом {process.exitcode}, перезапускаю")
+                processes[index] = spawn(index)
+        time.sleep(0.5)
+
+    deadline = time.monotonic() + Config.WEBHOOK_DRAIN_TIMEOUT + 5
+    for process in processes.values():
+        process.join(max(deadline - time.monotonic(), 0))
+        if process.is_alive():
+            process.kill()
+    sock.close()